@@ -0,0 +1,203 @@
+"""
+Offline analysis of logged positions, e.g. to find the blunders of a tournament.
+
+Reads positions in the format of State.to_linear_string, one per line and optionally
+preceded by a name (the format of benchmark_positions.txt), from a file or from stdin,
+and searches each one for the side to move at a fixed depth or for a fixed time:
+
+    python analysis.py positions.txt --depth 4 --output analysis.jsonl
+    cat positions.txt | python analysis.py - --time 2
+
+Positions are searched in parallel on a process pool and one JSON line per position
+(index, name, position, best move, score, depth, nodes, ...) is written as soon as it
+is done, so the output is in completion order. Running the same command again with
+the same output file skips the positions that are already in it, which resumes an
+interrupted run.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Set, TextIO, Tuple
+
+from bitboard_state import BitboardState
+from move_generator import generate_moves, move_string
+from search import SearchEngine
+from state import Turn
+
+# (index in the input, name, position)
+Job = Tuple[int, Optional[str], str]
+
+_worker_engines: Dict[Turn, SearchEngine] = {}
+_worker_settings: dict = {}
+
+
+def read_positions(lines: Iterable[str]) -> Iterator[Job]:
+    """
+    Parses positions, one per line as "position" or "name position"; blank lines and
+    lines starting with '#' are skipped.
+
+    :param lines: The lines of the input
+    :return: (index, name or None, position) triples, numbered from 0 in input order
+    """
+    index = 0
+    for line in lines:
+        fields = line.split()
+        if not fields or fields[0].startswith("#"):
+            continue
+        name, linear = (None, fields[0]) if len(fields) == 1 else (fields[0], fields[1])
+        yield index, name, linear
+        index += 1
+
+
+def completed_indices(path: str) -> Set[int]:
+    """
+    Reads the indices of the positions already analysed in an output file. Lines that
+    are not complete records are ignored, so their positions are analysed again.
+
+    :param path: A JSONL file written by `analyse`
+    :return: The set of completed input indices
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as output:
+        for line in output:
+            try:
+                done.add(json.loads(line)["index"])
+            except (ValueError, KeyError):
+                continue
+    return done
+
+
+def drop_partial_line(path: str):
+    """
+    Truncates an output file after its last complete line, so appending to it after an
+    interruption starts on a fresh line.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as output:
+        data = output.read()
+        if data and not data.endswith(b"\n"):
+            output.truncate(data.rfind(b"\n") + 1)
+
+
+def _init_worker(depth: Optional[int], time_limit: Optional[float], tt_size_mb: int):
+    _worker_settings.update(depth=depth, time_limit=time_limit, tt_size_mb=tt_size_mb)
+
+
+def _engine(color: Turn) -> SearchEngine:
+    engine = _worker_engines.get(color)
+    if engine is None:
+        depth = _worker_settings["depth"]
+        engine = SearchEngine(color, max_depth=depth or 64, tt_size_mb=_worker_settings["tt_size_mb"])
+        _worker_engines[color] = engine
+    return engine
+
+
+def analyse_position(job: Job) -> dict:
+    """
+    Searches one position for the side to move with the settings of the worker.
+
+    :param job: (index, name, position)
+    :return: The JSON record of the position
+    """
+    index, name, linear = job
+    record = {"index": index, "name": name, "position": linear}
+    try:
+        state = BitboardState.from_linear_string(linear)
+    except (ValueError, KeyError) as error:
+        record["error"] = f"invalid position: {error}"
+        return record
+    record["turn"] = state.turn.name if state.turn is not None else None
+    if state.turn not in (Turn.WHITE, Turn.BLACK) or not generate_moves(state):
+        record.update(best_move=None, score=None, depth=0, nodes=0, elapsed=0.0, pv=[])
+        return record
+
+    engine = _engine(state.turn)
+    # The results must not depend on which positions the worker happened to search before.
+    engine.clear()
+    time_limit = _worker_settings["time_limit"]
+    result = engine.search(state, time_limit if time_limit is not None else float("inf"))
+    record.update(
+        best_move=move_string(result.best_move) if result.best_move is not None else None,
+        score=result.score,
+        depth=result.depth,
+        nodes=result.nodes,
+        elapsed=round(result.elapsed, 4),
+        pv=[move_string(move) for move in result.principal_variation],
+    )
+    return record
+
+
+def analyse(jobs: List[Job], output: TextIO, depth: Optional[int] = None, time_limit: Optional[float] = None,
+            workers: Optional[int] = None, tt_size_mb: int = 16) -> int:
+    """
+    Analyses positions on a process pool, writing one JSON line per position as it completes.
+
+    :param jobs: The positions to analyse, as returned by `read_positions`
+    :param output: Where the JSON lines are written (flushed after every line)
+    :param depth: Fixed search depth (iterative deepening stops there)
+    :param time_limit: Seconds per position, if no depth is given
+    :param workers: Number of worker processes (defaults to the number of cores)
+    :param tt_size_mb: Memory cap of each worker's transposition tables in megabytes
+    :return: The number of positions written
+    """
+    if (depth is None) == (time_limit is None):
+        raise ValueError("give either a depth or a time per position")
+    workers = workers or os.cpu_count() or 1
+    initargs = (depth, time_limit, tt_size_mb)
+    if workers == 1:
+        _init_worker(*initargs)
+        return _write_records(map(analyse_position, jobs), output)
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=initargs) as pool:
+        return _write_records(pool.imap_unordered(analyse_position, jobs), output)
+
+
+def _write_records(records: Iterable[dict], output: TextIO) -> int:
+    count = 0
+    for record in records:
+        output.write(json.dumps(record) + "\n")
+        output.flush()
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search logged positions and write the results as JSON lines.")
+    parser.add_argument("input", help='file of positions ("position" or "name position" per line), - for stdin')
+    limit = parser.add_mutually_exclusive_group(required=True)
+    limit.add_argument("--depth", type=int, help="fixed search depth")
+    limit.add_argument("--time", type=float, help="seconds per position")
+    parser.add_argument("--output", default=None,
+                        help="JSONL file to append to; positions already in it are skipped (default: stdout)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--tt-size-mb", type=int, default=16, help="transposition table size of each engine")
+    args = parser.parse_args()
+
+    if args.input == "-":
+        jobs = list(read_positions(sys.stdin))
+    else:
+        with open(args.input) as positions:
+            jobs = list(read_positions(positions))
+
+    start = time.monotonic()
+    if args.output is None:
+        count = analyse(jobs, sys.stdout, args.depth, args.time, args.workers, args.tt_size_mb)
+        skipped = 0
+    else:
+        drop_partial_line(args.output)
+        done = completed_indices(args.output)
+        pending = [job for job in jobs if job[0] not in done]
+        skipped = len(jobs) - len(pending)
+        with open(args.output, "a") as output:
+            count = analyse(pending, output, args.depth, args.time, args.workers, args.tt_size_mb)
+    print(f"{count} positions analysed, {skipped} already done, in {time.monotonic() - start:.1f}s",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+In-process self-play arena: engine-vs-engine games on a process pool, without the server.
+
+Games are played in pairs from the same opening with colors swapped, so neither engine
+is favored by the openings. The openings are a few random plies drawn from the seed and
+every engine searches to a fixed depth, so a run with the same seed and settings always
+produces the same games, whatever the number of workers.
+
+Results are reported from engine A's point of view as wins/draws/losses, each with a 95%
+Wilson interval, plus the score and Elo difference with their 95% intervals.
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+from bitboard_state import BitboardState
+from heuristics.black_heuristics import BlackHeuristics
+from heuristics.white_heuristics import WhiteHeuristics
+from move_generator import generate_moves
+from search import SearchEngine
+from state import Turn
+
+# z for a two-sided 95% interval
+Z_95 = 1.959964
+
+
+class EngineConfig:
+    """
+    How one side of the match searches.
+
+    :param name: Label used in the report
+    :param depth: Fixed search depth
+    :param white_weights: Overrides of the WhiteHeuristics weights when playing white
+    :param black_weights: Overrides of the BlackHeuristics weights when playing black
+    """
+
+    def __init__(self, name: str, depth: int = 2, white_weights: Optional[dict] = None,
+                 black_weights: Optional[dict] = None):
+        self.name = name
+        self.depth = depth
+        self.white_weights = white_weights
+        self.black_weights = black_weights
+
+    @classmethod
+    def from_weights_file(cls, name: str, depth: int, path: Optional[str]) -> 'EngineConfig':
+        """
+        Builds a config from a JSON file of the form {"white": {...}, "black": {...}}.
+        The file overrides the built-in weights; without a file the config plays with the
+        built-in weights alone, even if the heuristics have a weights file configured
+        (heuristics.WEIGHTS_FILE), so tuned weights only play when they are named.
+        """
+        weights = {}
+        if path is not None:
+            with open(path) as weights_file:
+                weights = json.load(weights_file)
+        return cls(name, depth, {**WhiteHeuristics.DEFAULT_WEIGHTS, **weights.get("white", {})},
+                   {**BlackHeuristics.DEFAULT_WEIGHTS, **weights.get("black", {})})
+
+    def make_engine(self, color: Turn) -> SearchEngine:
+        weights = self.white_weights if color == Turn.WHITE else self.black_weights
+        return SearchEngine(color, max_depth=self.depth, tt_size_mb=8, weights=weights)
+
+
+def random_opening(seed: int, pair: int, plies: int) -> BitboardState:
+    """
+    Plays `plies` random legal moves from the start, drawn from (seed, pair).
+    """
+    rng = random.Random(seed * 1000003 + pair)
+    state = BitboardState.initial()
+    for _ in range(plies):
+        moves = generate_moves(state)
+        if not moves:
+            break
+        state.apply_move(rng.choice(moves))
+        if state.turn not in (Turn.WHITE, Turn.BLACK):
+            # The opening ended the game: start the pair again from the initial position.
+            return BitboardState.initial()
+    return state
+
+
+def play_game(game: int, seed: int, engine_a: EngineConfig, engine_b: EngineConfig,
+              opening_plies: int, max_plies: int, positions: Optional[list] = None) -> Tuple[int, str, int]:
+    """
+    Plays one game. Even games have A as white, odd games B, and games 2k and 2k+1
+    share their opening.
+
+    :param game: Index of the game in the match
+    :param seed: Match seed
+    :param engine_a: First engine
+    :param engine_b: Second engine
+    :param opening_plies: Random plies played before the engines take over
+    :param max_plies: Plies after which the game is scored as a draw
+    :param positions: If given, the positions the engines searched are appended to it
+    :return: (game index, result from A's point of view as "W", "D" or "L", plies played)
+    """
+    a_is_white = game % 2 == 0
+    state = random_opening(seed, game // 2, opening_plies)
+    white, black = (engine_a, engine_b) if a_is_white else (engine_b, engine_a)
+    engines = {Turn.WHITE: white.make_engine(Turn.WHITE), Turn.BLACK: black.make_engine(Turn.BLACK)}
+    plies = 0
+    winner = None
+    while plies < max_plies:
+        if state.turn == Turn.WHITEWIN or state.turn == Turn.BLACKWIN:
+            winner = Turn.WHITE if state.turn == Turn.WHITEWIN else Turn.BLACK
+            break
+        if state.turn == Turn.DRAW:
+            break
+        if not generate_moves(state):
+            # No legal moves is a loss for the side to move.
+            winner = Turn.BLACK if state.turn == Turn.WHITE else Turn.WHITE
+            break
+        if positions is not None:
+            positions.append(state.clone())
+        result = engines[state.turn].search(state, float("inf"))
+        state.apply_move(result.best_move)
+        plies += 1
+    if winner is None:
+        return game, "D", plies
+    a_won = (winner == Turn.WHITE) == a_is_white
+    return game, "W" if a_won else "L", plies
+
+
+def _play_game(arguments: tuple) -> Tuple[int, str, int]:
+    return play_game(*arguments)
+
+
+def wilson_interval(successes: int, total: int) -> Tuple[float, float]:
+    """
+    95% Wilson score interval of a proportion.
+    """
+    if total == 0:
+        return 0.0, 1.0
+    p = successes / total
+    denominator = 1 + Z_95 ** 2 / total
+    center = (p + Z_95 ** 2 / (2 * total)) / denominator
+    half_width = Z_95 * math.sqrt(p * (1 - p) / total + Z_95 ** 2 / (4 * total ** 2)) / denominator
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+def elo_difference(score: float) -> float:
+    """
+    Elo difference implied by an expected score, clamped to +-1000 at 0% and 100%.
+    """
+    if score <= 0.0:
+        return -1000.0
+    if score >= 1.0:
+        return 1000.0
+    return max(-1000.0, min(1000.0, -400 * math.log10(1 / score - 1)))
+
+
+def summarize(results: List[Tuple[int, str, int]], elapsed: float) -> Dict[str, object]:
+    """
+    Builds the match report from the game results.
+
+    :param results: (game, result, plies) of every game
+    :param elapsed: Wall time of the match in seconds
+    :return: The report as a dict
+    """
+    games = len(results)
+    counts = {outcome: sum(1 for _, result, _ in results if result == outcome) for outcome in "WDL"}
+    points = [1.0 if result == "W" else 0.5 if result == "D" else 0.0 for _, result, _ in results]
+    score = sum(points) / games if games else 0.0
+    variance = sum((point - score) ** 2 for point in points) / games if games else 0.0
+    margin = Z_95 * math.sqrt(variance / games) if games else 0.0
+    return {
+        "games": games,
+        "wins": counts["W"],
+        "draws": counts["D"],
+        "losses": counts["L"],
+        "win_rate_ci": wilson_interval(counts["W"], games),
+        "draw_rate_ci": wilson_interval(counts["D"], games),
+        "loss_rate_ci": wilson_interval(counts["L"], games),
+        "score": score,
+        "score_ci": (max(0.0, score - margin), min(1.0, score + margin)),
+        "elo": elo_difference(score),
+        "elo_ci": (elo_difference(score - margin), elo_difference(score + margin)),
+        "average_plies": sum(plies for _, _, plies in results) / games if games else 0.0,
+        "seconds": elapsed,
+        "games_per_minute": games / elapsed * 60 if elapsed > 0 else 0.0,
+    }
+
+
+def run_match(engine_a: EngineConfig, engine_b: EngineConfig, games: int, seed: int = 0,
+              workers: Optional[int] = None, opening_plies: int = 4, max_plies: int = 200) -> Dict[str, object]:
+    """
+    Plays a match on a process pool and reports it from A's point of view.
+
+    :param engine_a: First engine
+    :param engine_b: Second engine
+    :param games: Number of games (rounded up to an even number so every opening is played twice)
+    :param seed: Seed of the random openings
+    :param workers: Number of worker processes (defaults to the number of cores)
+    :param opening_plies: Random plies played before the engines take over
+    :param max_plies: Plies after which a game is scored as a draw
+    :return: The report of `summarize`, plus the per-game results
+    """
+    games += games % 2
+    jobs = [(game, seed, engine_a, engine_b, opening_plies, max_plies) for game in range(games)]
+    start = time.monotonic()
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        results = [_play_game(job) for job in jobs]
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            results = list(pool.imap_unordered(_play_game, jobs))
+    results.sort()
+    report = summarize(results, time.monotonic() - start)
+    report["engine_a"] = engine_a.name
+    report["engine_b"] = engine_b.name
+    report["seed"] = seed
+    report["results"] = "".join(result for _, result, _ in results)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play a self-play match between two engine configurations.")
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--depth", type=int, default=2, help="search depth of engine A")
+    parser.add_argument("--depth-b", type=int, default=None, help="search depth of engine B (default: --depth)")
+    parser.add_argument("--weights-a", default=None, help='JSON weights file {"white": {...}, "black": {...}} '
+                             "(default: the built-in weights, whatever weights file the heuristics load)")
+    parser.add_argument("--weights-b", default=None, help="JSON weights file of engine B")
+    parser.add_argument("--opening-plies", type=int, default=4)
+    parser.add_argument("--max-plies", type=int, default=200)
+    args = parser.parse_args()
+
+    engine_a = EngineConfig.from_weights_file(args.weights_a or "default", args.depth, args.weights_a)
+    engine_b = EngineConfig.from_weights_file(args.weights_b or "default", args.depth_b or args.depth,
+                                              args.weights_b)
+    report = run_match(engine_a, engine_b, args.games, args.seed, args.workers,
+                       args.opening_plies, args.max_plies)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
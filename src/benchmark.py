@@ -0,0 +1,268 @@
+"""
+Reproducible speed benchmark of the hot paths on a fixed corpus of positions.
+
+Every run times move generation, `clone`, hashing (`__hash__` of a State and the full
+Zobrist key of a BitboardState, whose `__hash__` only returns the cached key) and
+`evaluate_state` (for both colors) in microseconds per call over the positions of
+benchmark_positions.txt, and fixed-depth searches in nodes per second. Every metric is measured several times and
+reports its best value together with its spread, the relative gap between the median
+and the best measurement. The report is JSON; saving it and passing it later with
+--compare flags every metric whose best value got slower by more than the tolerance,
+plus at most the same amount again when the runs were noisy.
+
+The corpus must hold at least one position of every category of REQUIRED_CATEGORIES,
+recognised by the prefix of the position names.
+
+    python benchmark.py --output baseline.json
+    python benchmark.py --compare baseline.json
+"""
+import argparse
+import contextlib
+import gc
+import json
+import math
+import os
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+from bitboard_state import BitboardState
+from heuristics.black_heuristics import BlackHeuristics
+from heuristics.white_heuristics import WhiteHeuristics
+from move_generator import generate_moves
+from search import SearchEngine
+from state import State
+from zobrist import hash_bitboards
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_positions.txt")
+# Relative slowdown above which a metric is reported as a regression.
+DEFAULT_TOLERANCE = 0.10
+SEARCH_REPEATS = 7
+# Minimum seconds of searching in one timing sample of a position.
+SEARCH_SAMPLE_TIME = 0.3
+MICRO_ROUNDS = 20
+# Name prefixes of the kinds of positions the corpus has to cover.
+REQUIRED_CATEGORIES = ("opening", "middlegame", "king_edge", "few_pieces")
+
+
+def load_corpus(path: str = DEFAULT_CORPUS) -> List[Tuple[str, BitboardState]]:
+    """
+    Reads a corpus file: one "name position" pair per line, '#' starts a comment.
+
+    :param path: The corpus file
+    :return: (name, state) pairs in file order
+    """
+    positions = []
+    with open(path) as corpus:
+        for line in corpus:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            name, linear = line.split()
+            positions.append((name, BitboardState.from_linear_string(linear)))
+    return positions
+
+
+def missing_categories(positions: List[Tuple[str, BitboardState]]) -> List[str]:
+    """
+    Lists the categories of REQUIRED_CATEGORIES that no position name starts with.
+
+    :param positions: (name, state) pairs, as returned by `load_corpus`
+    :return: The missing categories, empty if the corpus covers all of them
+    """
+    return [category for category in REQUIRED_CATEGORIES
+            if not any(name.startswith(category) for name, _ in positions)]
+
+
+def _hash_from_scratch(state: BitboardState) -> int:
+    # BitboardState.__hash__ returns the incrementally kept key; this times the full computation.
+    return hash_bitboards(state.white, state.black, state.king, state.throne, state.turn)
+
+
+@contextlib.contextmanager
+def _without_gc():
+    # Like timeit: a collection triggered by earlier garbage must not land in a timed round.
+    gc.collect()
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def spread(times: List[float]) -> float:
+    """
+    Measures the noise of repeated timings of the same work.
+
+    :param times: The elapsed times of the repeats
+    :return: How much slower the median repeat is than the fastest one, e.g. 0.05 for 5%
+    """
+    best = min(times)
+    return statistics.median(times) / best - 1 if best > 0 else 0.0
+
+
+def time_per_call(benchmarks: Dict[str, Tuple[Callable, list]], min_time: float) -> Dict[str, Tuple[float, float]]:
+    """
+    Times micro-benchmarks in MICRO_ROUNDS rounds. A round of a benchmark calls its
+    function on every argument, as many times over as fit in min_time / MICRO_ROUNDS
+    seconds, and the benchmarks take turns round by round, so a slow stretch of the
+    machine shows up in the spread of all of them.
+
+    :param benchmarks: name -> (function, arguments)
+    :param min_time: Minimum seconds spent on each benchmark
+    :return: name -> (microseconds per call of the fastest round, spread of the rounds)
+    """
+    round_time = min_time / MICRO_ROUNDS
+    passes = {name: _calibrate(function, arguments, round_time)
+              for name, (function, arguments) in benchmarks.items()}
+    rounds: Dict[str, List[float]] = {name: [] for name in benchmarks}
+    with _without_gc():
+        for _ in range(MICRO_ROUNDS):
+            for name, (function, arguments) in benchmarks.items():
+                start = time.perf_counter()
+                for _ in range(passes[name]):
+                    for argument in arguments:
+                        function(argument)
+                rounds[name].append(time.perf_counter() - start)
+    return {name: (min(times) / (passes[name] * len(benchmarks[name][1])) * 1e6, spread(times))
+            for name, times in rounds.items()}
+
+
+def _calibrate(function: Callable, arguments: list, round_time: float) -> int:
+    # Like timeit.autorange: double the passes over the arguments until they take round_time.
+    passes = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(passes):
+            for argument in arguments:
+                function(argument)
+        if time.perf_counter() - start >= round_time:
+            return passes
+        passes *= 2
+
+
+def run_benchmarks(positions: List[Tuple[str, BitboardState]], depth: int, min_time: float) -> dict:
+    """
+    Runs every benchmark on the corpus.
+
+    :param positions: (name, state) pairs
+    :param depth: Depth of the fixed-depth searches
+    :param min_time: Minimum seconds spent on each micro-benchmark
+    :return: The report: metadata plus a "metrics" dict of name -> {"value", "spread", "unit"}
+    """
+    states = [state for _, state in positions]
+    list_states = [state.to_state() for state in states]
+    metrics: Dict[str, dict] = {}
+
+    micro = {
+        "movegen": (generate_moves, states),
+        "clone_bitboard": (BitboardState.clone, states),
+        "clone_list": (State.clone, list_states),
+        "hash_bitboard": (_hash_from_scratch, states),
+        "hash_list": (hash, list_states),
+        "evaluate_white": (WhiteHeuristics.evaluate_state, [WhiteHeuristics(state) for state in states]),
+        "evaluate_black": (BlackHeuristics.evaluate_state, [BlackHeuristics(state) for state in states]),
+    }
+    for name, (value, noise) in time_per_call(micro, min_time).items():
+        metrics[name] = {"value": value, "spread": noise, "unit": "us/call"}
+
+    # A fresh engine every time, so each search visits the same tree. A sample of a
+    # position repeats its search for at least SEARCH_SAMPLE_TIME seconds, so short
+    # searches are not at the mercy of a single hiccup, and the samples go round the
+    # whole corpus, so a slow stretch of the machine shows up in the spread of every
+    # position instead of in the best time of one of them.
+    nodes: Dict[str, int] = {}
+    searches: Dict[str, int] = {}
+    for name, state in positions:
+        result = SearchEngine(state.turn, max_depth=depth).search(state, float("inf"))
+        nodes[name] = result.nodes
+        searches[name] = max(1, math.ceil(SEARCH_SAMPLE_TIME / max(result.elapsed, 1e-6)))
+    times: Dict[str, List[float]] = {name: [] for name, _ in positions}
+    for _ in range(SEARCH_REPEATS):
+        for name, state in positions:
+            elapsed = 0.0
+            for _ in range(searches[name]):
+                engine = SearchEngine(state.turn, max_depth=depth)
+                with _without_gc():
+                    elapsed += engine.search(state, float("inf")).elapsed
+            times[name].append(elapsed / searches[name])
+    for name, _ in positions:
+        best = min(times[name])
+        metrics[f"search_{name}"] = {"value": nodes[name] / best if best > 0 else 0.0,
+                                     "spread": spread(times[name]), "unit": "nodes/s"}
+    best_total = sum(min(elapsed) for elapsed in times.values())
+    totals = [sum(repeat) for repeat in zip(*times.values())]
+    metrics["search_total"] = {"value": sum(nodes.values()) / best_total if best_total > 0 else 0.0,
+                               "spread": spread(totals), "unit": "nodes/s"}
+
+    return {
+        "python": sys.version.split()[0],
+        "positions": len(positions),
+        "depth": depth,
+        "metrics": metrics,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """
+    Lists the metrics of the report whose best value is worse than in the baseline
+    (higher for us/call, lower for nodes/s) by more than the tolerance. The larger
+    spread of the two runs widens the margin, but by no more than the tolerance, so
+    noise never hides a slowdown of more than twice the tolerance.
+
+    :param report: The current report
+    :param baseline: A report saved earlier
+    :param tolerance: Allowed relative slowdown, e.g. 0.1 for 10%
+    :return: One line per regression, empty if there are none
+    """
+    regressions = []
+    for name, metric in report["metrics"].items():
+        old = baseline["metrics"].get(name)
+        if old is None or old["value"] <= 0 or metric["value"] <= 0:
+            continue
+        if metric["unit"] == "nodes/s":
+            slowdown = old["value"] / metric["value"] - 1
+        else:
+            slowdown = metric["value"] / old["value"] - 1
+        margin = tolerance + min(max(old.get("spread", 0.0), metric.get("spread", 0.0)), tolerance)
+        if slowdown > margin:
+            regressions.append(f"{name}: {old['value']:.2f} -> {metric['value']:.2f} {metric['unit']} "
+                               f"({slowdown:+.0%} slower, allowed {margin:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark move generation, hashing, evaluation and search.")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--depth", type=int, default=3, help="depth of the fixed-depth searches")
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds spent on each micro-benchmark")
+    parser.add_argument("--output", default=None, help="also write the report to this file")
+    parser.add_argument("--compare", default=None, help="baseline report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    positions = load_corpus(args.corpus)
+    missing = missing_categories(positions)
+    if missing:
+        parser.error(f"{args.corpus} has no positions of the categories {', '.join(missing)}")
+    report = run_benchmarks(positions, args.depth, args.min_time)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(report, baseline, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,464 @@
+from typing import List
+
+from geometry import (BOARD_SIZE, NUM_SQUARES, FULL_MASK, THRONE_SQUARE, THRONE_BIT, ESCAPE_MASK,
+                      WHITE_CAPTURE_ANVILS, BLACK_CAPTURE_ANVILS, KING_CAPTURE_SIDES, NEIGHBOURS,
+                      rotate_180, square)
+from state import State, Pawn, Turn
+from zobrist import WHITE_KEYS, BLACK_KEYS, KING_KEYS, THRONE_KEYS, TURN_KEYS, hash_bitboards
+
+INITIAL_BOARD = (
+    "OOOBBBOOO"
+    "OOOOBOOOO"
+    "OOOOWOOOO"
+    "BOOOWOOOB"
+    "BBWWKWWBB"
+    "BOOOWOOOB"
+    "OOOOWOOOO"
+    "OOOOBOOOO"
+    "OOOBBBOOO"
+)
+
+_TURN_KEYS = {turn: TURN_KEYS[turn.value] for turn in Turn}
+_TURN_KEYS[None] = 0
+_THRONE_KEY = THRONE_KEYS[THRONE_SQUARE]
+# The keys of the squares the 180 degree rotation sends each square to (sq -> 80 - sq).
+_WHITE_KEYS_180 = WHITE_KEYS[::-1]
+_BLACK_KEYS_180 = BLACK_KEYS[::-1]
+_KING_KEYS_180 = KING_KEYS[::-1]
+
+
+class BitboardState(State):
+    """
+    A State whose board is packed into 81-bit integer bitboards, one per piece type
+    (white pawns, black pawns, king), plus a one-bit board marking an empty throne.
+    Square (row, column) is stored at bit row * 9 + column.
+
+    The Zobrist key of the position (see zobrist.py) is kept in `zobrist` and updated
+    incrementally by `apply_move`, and so is `zobrist_180`, the key of the position
+    rotated by 180 degrees, from which symmetry.canonical_key is read. `seen` counts the keys of the positions reached so far
+    in the game, so that reaching a position a second time ends the game in a DRAW.
+
+    The public API is the same as State: `get_pawn`, `get_board`, `board_string`,
+    `to_linear_string` and `__eq__` return exactly what a list-backed State with the
+    same board would return, so the heuristics can run on either representation.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty game state with no pieces and no turn set.
+        """
+        self.white = 0
+        self.black = 0
+        self.king = 0
+        self.throne = 0
+        self.turn = None
+        self.zobrist = 0
+        self.zobrist_180 = 0
+        self.seen = {}
+        self.undo_log = []
+
+    @classmethod
+    def from_state(cls, state: State) -> 'BitboardState':
+        """
+        Builds a bitboard state from any State.
+
+        :param state: The State to convert
+        :return: A new BitboardState with the same board and turn
+        """
+        if isinstance(state, BitboardState):
+            return state.clone()
+        bitboard_state = cls()
+        bitboard_state.set_board(state.get_board())
+        bitboard_state.set_turn(state.get_turn())
+        return bitboard_state
+
+    @classmethod
+    def from_linear_string(cls, linear: str) -> 'BitboardState':
+        """
+        Builds a bitboard state from the output of `to_linear_string`.
+
+        :param linear: 81 pawn characters followed by the turn value (e.g. 'W')
+        :return: A new BitboardState with that board and turn
+        """
+        state = cls()
+        for sq, char in enumerate(linear[:NUM_SQUARES]):
+            pawn = Pawn(char)
+            if pawn == Pawn.WHITE:
+                state.white |= 1 << sq
+            elif pawn == Pawn.BLACK:
+                state.black |= 1 << sq
+            elif pawn == Pawn.KING:
+                state.king |= 1 << sq
+            elif pawn == Pawn.THRONE:
+                state.throne |= 1 << sq
+        turn = linear[NUM_SQUARES:]
+        state.turn = Turn(turn) if turn else None
+        state.reset_history()
+        return state
+
+    @classmethod
+    def initial(cls) -> 'BitboardState':
+        """
+        Builds the standard Ashton Tablut opening position, with white to move.
+
+        :return: A new BitboardState with the opening board
+        """
+        return cls.from_linear_string(INITIAL_BOARD + Turn.WHITE.value)
+
+    def reset_history(self):
+        """
+        Recomputes the Zobrist key from scratch and forgets the positions seen so far,
+        making the current position the first of the game.
+        """
+        self._rehash()
+        self.seen = {self.zobrist: 1}
+        self.undo_log = []
+
+    def _rehash(self):
+        # Recomputes both Zobrist keys from the bitboards.
+        self.zobrist = hash_bitboards(self.white, self.black, self.king, self.throne, self.turn)
+        self.zobrist_180 = hash_bitboards(rotate_180(self.white), rotate_180(self.black), rotate_180(self.king),
+                                          self.throne, self.turn)
+
+    def to_state(self) -> State:
+        """
+        Converts this state to a list-backed State.
+
+        :return: A new State with the same board and turn
+        """
+        state = State()
+        state.set_board(self.get_board())
+        state.set_turn(self.turn)
+        return state
+
+    @property
+    def board(self) -> List[List[Pawn]]:
+        """
+        The board materialized as a 2D list of Pawn objects.
+        A new list is built on every access, so mutating it does not change the state.
+        """
+        return [[self.get_pawn(row, column) for column in range(BOARD_SIZE)]
+                for row in range(BOARD_SIZE)]
+
+    @board.setter
+    def board(self, board: List[List[Pawn]]):
+        self.set_board(board)
+
+    def set_board(self, board: List[List[Pawn]]):
+        """
+        Sets the board configuration, packing it into the bitboards.
+
+        :param board: 2D list of Pawn objects representing the new board
+        """
+        self.white = self.black = self.king = self.throne = 0
+        if board is None:
+            self.reset_history()
+            return
+        for row, pawns in enumerate(board):
+            for column, pawn in enumerate(pawns):
+                bit = 1 << square(row, column)
+                if pawn == Pawn.WHITE:
+                    self.white |= bit
+                elif pawn == Pawn.BLACK:
+                    self.black |= bit
+                elif pawn == Pawn.KING:
+                    self.king |= bit
+                elif pawn == Pawn.THRONE:
+                    self.throne |= bit
+        self.reset_history()
+
+    def set_turn(self, turn: Turn):
+        """
+        Sets the current player's turn, updating the Zobrist key.
+
+        :param turn: The Turn to set as the current turn
+        """
+        turn_keys = _TURN_KEYS[self.turn] ^ _TURN_KEYS[turn]
+        self.zobrist ^= turn_keys
+        self.zobrist_180 ^= turn_keys
+        self.turn = turn
+
+    def get_pawn(self, row: int, column: int) -> Pawn:
+        """
+        Retrieves the pawn at a specific board position.
+
+        :param row: Row index of the pawn
+        :param column: Column index of the pawn
+        :return: The Pawn at the specified position
+        """
+        bit = 1 << (row * BOARD_SIZE + column)
+        if self.white & bit:
+            return Pawn.WHITE
+        if self.black & bit:
+            return Pawn.BLACK
+        if self.king & bit:
+            return Pawn.KING
+        if self.throne & bit:
+            return Pawn.THRONE
+        return Pawn.EMPTY
+
+    def remove_pawn(self, row: int, column: int):
+        """
+        Removes a pawn from a specific position on the board by setting it to EMPTY.
+        The current position is counted in `seen` under its new key instead of the old one,
+        so repetitions are detected on the edited board; `undo_move` afterwards takes back
+        the edit together with the last move.
+
+        :param row: Row index of the position
+        :param column: Column index of the position
+        """
+        old_key = self.zobrist
+        mask = FULL_MASK ^ (1 << square(row, column))
+        self.white &= mask
+        self.black &= mask
+        self.king &= mask
+        self.throne &= mask
+        self._rehash()
+        count = self.seen.get(old_key, 0)
+        if count:
+            if count > 1:
+                self.seen[old_key] = count - 1
+            else:
+                del self.seen[old_key]
+            self.seen[self.zobrist] = self.seen.get(self.zobrist, 0) + 1
+
+    def board_string(self) -> str:
+        """
+        Creates a string representation of the board, with each row on a new line.
+
+        :return: A formatted string representing the board
+        """
+        rows = []
+        for row in range(BOARD_SIZE):
+            rows.append("".join(self.get_pawn(row, column).value for column in range(BOARD_SIZE)))
+        return "\n".join(rows)
+
+    def occupied(self) -> int:
+        """
+        Returns the bitboard of all squares holding a piece (the throne marker excluded).
+
+        :return: Bitboard of the occupied squares
+        """
+        return self.white | self.black | self.king
+
+    def get_number_of(self, color: Pawn) -> int:
+        """
+        Counts the number of cells containing a specific pawn type with a popcount.
+
+        :param color: The Pawn type to count (e.g., WHITE, BLACK)
+        :return: The number of cells containing the specified pawn type
+        """
+        if color == Pawn.WHITE:
+            return self.white.bit_count()
+        if color == Pawn.BLACK:
+            return self.black.bit_count()
+        if color == Pawn.KING:
+            return self.king.bit_count()
+        if color == Pawn.THRONE:
+            return self.throne.bit_count()
+        if color == Pawn.EMPTY:
+            return NUM_SQUARES - (self.occupied() | self.throne).bit_count()
+        return 0
+
+    def get_number_on(self, color: Pawn, mask: int) -> int:
+        """
+        Counts how many of the given squares contain a specific pawn type,
+        with a popcount of the pawn bitboard masked by the squares.
+
+        :param color: The Pawn type to count (e.g., WHITE, BLACK)
+        :param mask: A bitboard of the squares, one of the *_MASK constants of geometry
+        :return: The number of those squares containing the specified pawn type
+        """
+        if color == Pawn.WHITE:
+            return (self.white & mask).bit_count()
+        if color == Pawn.BLACK:
+            return (self.black & mask).bit_count()
+        if color == Pawn.KING:
+            return (self.king & mask).bit_count()
+        return sum(self.get_pawn(*divmod(sq, BOARD_SIZE)) == color for sq in range(NUM_SQUARES) if mask >> sq & 1)
+
+    def get_king_position(self) -> List[int]:
+        """
+        Finds the king from its bitboard, which `apply_move` and `undo_move` keep up to date.
+
+        :return: The [row, column] of the king, or [-1, -1] if there is no king
+        """
+        if not self.king:
+            return [-1, -1]
+        return list(divmod(self.king.bit_length() - 1, BOARD_SIZE))
+
+    def __eq__(self, other) -> bool:
+        """
+        Checks if two states are equal by comparing their boards and turns.
+        Two bitboard states are compared on the integers directly; any other State
+        is compared on the materialized board, exactly as State does.
+
+        :param other: The other State to compare with
+        :return: True if states are equal, False otherwise
+        """
+        if isinstance(other, BitboardState):
+            return (self.white == other.white and self.black == other.black
+                    and self.king == other.king and self.throne == other.throne
+                    and self.turn == other.turn)
+        return State.__eq__(self, other)
+
+    def __hash__(self) -> int:
+        """
+        Returns the Zobrist key of the state, which is equal to State.__hash__ of the same board.
+
+        :return: Hash code of the state
+        """
+        return self.zobrist
+
+    def zobrist_key(self) -> int:
+        """
+        Returns the 64-bit Zobrist key of the state. Unlike hash(), which Python may
+        reduce, this value is stable across processes and suitable for persistent caches.
+
+        :return: The unsigned 64-bit key
+        """
+        return self.zobrist
+
+    def clone(self) -> 'BitboardState':
+        """
+        Creates a copy of the current state. Bitboards are immutable integers,
+        so no deep copy is needed.
+
+        :return: A new BitboardState with the same board and turn
+        """
+        cloned_state = BitboardState.__new__(BitboardState)
+        cloned_state.white = self.white
+        cloned_state.black = self.black
+        cloned_state.king = self.king
+        cloned_state.throne = self.throne
+        cloned_state.turn = self.turn
+        cloned_state.zobrist = self.zobrist
+        cloned_state.zobrist_180 = self.zobrist_180
+        cloned_state.seen = dict(self.seen)
+        cloned_state.undo_log = []
+        return cloned_state
+
+    def apply_move(self, move: tuple):
+        """
+        Plays a legal move in place: moves the piece, removes captured pieces and
+        passes the turn to the opponent, or sets WHITEWIN/BLACKWIN if the game is over
+        and DRAW if the position was already reached in the game.
+        The previous position is pushed on the undo log so `undo_move` can restore it.
+
+        :param move: A (from_square, to_square) move of the player whose turn it is
+        """
+        from_sq, to_sq = move
+        turn = self.turn
+        self.undo_log.append((self.white, self.black, self.king, self.throne, turn, self.zobrist, self.zobrist_180))
+        bits = (1 << from_sq) | (1 << to_sq)
+        if turn == Turn.WHITE:
+            if self.white >> from_sq & 1:
+                self.white ^= bits
+                self.zobrist ^= WHITE_KEYS[from_sq] ^ WHITE_KEYS[to_sq]
+                self.zobrist_180 ^= _WHITE_KEYS_180[from_sq] ^ _WHITE_KEYS_180[to_sq]
+            else:
+                self.king ^= bits
+                self.zobrist ^= KING_KEYS[from_sq] ^ KING_KEYS[to_sq]
+                self.zobrist_180 ^= _KING_KEYS_180[from_sq] ^ _KING_KEYS_180[to_sq]
+                if from_sq == THRONE_SQUARE:
+                    # The throne is the center of the rotation, so both keys use the same key.
+                    self.throne = THRONE_BIT
+                    self.zobrist ^= _THRONE_KEY
+                    self.zobrist_180 ^= _THRONE_KEY
+                if ESCAPE_MASK >> to_sq & 1:
+                    self.turn = Turn.WHITEWIN
+                    turn_keys = _TURN_KEYS[turn] ^ _TURN_KEYS[Turn.WHITEWIN]
+                    self.zobrist ^= turn_keys
+                    self.zobrist_180 ^= turn_keys
+                    return
+            self.turn = Turn.BLACK
+            turn_keys = _TURN_KEYS[turn] ^ _TURN_KEYS[Turn.BLACK]
+            self.zobrist ^= turn_keys
+            self.zobrist_180 ^= turn_keys
+            self._white_captures(to_sq)
+        else:
+            self.black ^= bits
+            self.turn = Turn.WHITE
+            turn_keys = _TURN_KEYS[turn] ^ _TURN_KEYS[Turn.WHITE]
+            self.zobrist ^= BLACK_KEYS[from_sq] ^ BLACK_KEYS[to_sq] ^ turn_keys
+            self.zobrist_180 ^= _BLACK_KEYS_180[from_sq] ^ _BLACK_KEYS_180[to_sq] ^ turn_keys
+            self._black_captures(to_sq)
+            if self.turn == Turn.BLACKWIN:
+                return
+        count = self.seen.get(self.zobrist, 0)
+        self.seen[self.zobrist] = count + 1
+        if count:
+            turn_keys = _TURN_KEYS[self.turn] ^ _TURN_KEYS[Turn.DRAW]
+            self.zobrist ^= turn_keys
+            self.zobrist_180 ^= turn_keys
+            self.turn = Turn.DRAW
+
+    def undo_move(self):
+        """
+        Takes back the last move played with `apply_move`, restoring captured pieces and the turn.
+        """
+        white, black, king, throne, turn, zobrist, zobrist_180 = self.undo_log.pop()
+        if self.turn != Turn.WHITEWIN and self.turn != Turn.BLACKWIN:
+            key = self.zobrist
+            if self.turn == Turn.DRAW:
+                # The position was counted with the opponent to move, before the DRAW turn was set.
+                key ^= _TURN_KEYS[Turn.DRAW] ^ _TURN_KEYS[Turn.BLACK if turn == Turn.WHITE else Turn.WHITE]
+            count = self.seen[key] - 1
+            if count:
+                self.seen[key] = count
+            else:
+                del self.seen[key]
+        self.white, self.black, self.king, self.throne, self.turn = white, black, king, throne, turn
+        self.zobrist, self.zobrist_180 = zobrist, zobrist_180
+
+    def _white_captures(self, to_sq: int):
+        """
+        Removes the black pawns sandwiched by the white piece (pawn or king) that landed on to_sq.
+        """
+        anvils = self.white | self.king | WHITE_CAPTURE_ANVILS
+        for adjacent, beyond in NEIGHBOURS[to_sq]:
+            if beyond >= 0 and self.black >> adjacent & 1 and anvils >> beyond & 1:
+                self.black ^= 1 << adjacent
+                self.zobrist ^= BLACK_KEYS[adjacent]
+                self.zobrist_180 ^= _BLACK_KEYS_180[adjacent]
+
+    def _black_captures(self, to_sq: int):
+        """
+        Removes the white pawns sandwiched by the black pawn that landed on to_sq,
+        and captures the king if it is surrounded (see `_king_captured`).
+        """
+        anvils = self.black | BLACK_CAPTURE_ANVILS
+        if not self.king & THRONE_BIT:
+            anvils |= THRONE_BIT
+        for adjacent, beyond in NEIGHBOURS[to_sq]:
+            if adjacent < 0:
+                continue
+            if self.white >> adjacent & 1:
+                if beyond >= 0 and anvils >> beyond & 1:
+                    self.white ^= 1 << adjacent
+                    self.zobrist ^= WHITE_KEYS[adjacent]
+                    self.zobrist_180 ^= _WHITE_KEYS_180[adjacent]
+            elif self.king >> adjacent & 1 and self._king_captured(adjacent, beyond):
+                self.king = 0
+                self.turn = Turn.BLACKWIN
+                turn_keys = _TURN_KEYS[Turn.WHITE] ^ _TURN_KEYS[Turn.BLACKWIN]
+                self.zobrist ^= KING_KEYS[adjacent] ^ turn_keys
+                self.zobrist_180 ^= _KING_KEYS_180[adjacent] ^ turn_keys
+                return
+
+    def _king_captured(self, king_sq: int, beyond: int) -> bool:
+        """
+        Checks whether the king next to a black pawn that just moved is captured:
+        it needs black on all 4 sides on the throne, on the 3 free sides next to the
+        throne, and on 2 opposite sides (a citadel counts as black) anywhere else.
+
+        :param king_sq: The square of the king
+        :param beyond: The square on the far side of the king from the black pawn that moved
+        :return: True if the king is captured
+        """
+        if KING_CAPTURE_SIDES[king_sq] > 2:
+            for adjacent, _ in NEIGHBOURS[king_sq]:
+                if adjacent != THRONE_SQUARE and not self.black >> adjacent & 1:
+                    return False
+            return True
+        return beyond >= 0 and (self.black | BLACK_CAPTURE_ANVILS) >> beyond & 1 == 1
@@ -0,0 +1,233 @@
+"""
+Compact binary storage of game records for tuning datasets and benchmarks.
+
+A file is an 8-byte magic followed by fixed-size little-endian records, one per position:
+
+    white bitboard, low 64 bits (uint64) | black bitboard, low 64 bits (uint64)
+    white bitboard, high 17 bits (uint32) | black bitboard, high 17 bits (uint32)
+    game number (uint32) | king square (uint8, 255 if none) | turn (uint8, 0 white, 1 black)
+    flags (uint8, bit 0: throne empty) | outcome of the game (int8: 1 white won, -1 black won, 0 draw)
+
+That is 32 bytes per position instead of 82 characters for `to_linear_string`. The writer
+only ever appends whole games, so the record count follows from the file size, and the
+reader maps the file and exposes the records as a NumPy structured array without copying.
+"""
+import mmap
+import os
+from typing import Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from bitboard_state import BitboardState
+from geometry import BOARD_SIZE, NUM_SQUARES, THRONE_BIT
+from heuristics.batch_evaluation import WHITE, BLACK, KING, THRONE
+from state import State, Turn
+
+MAGIC = b"TBLTGR01"
+RECORD_DTYPE = np.dtype([
+    ("white_low", "<u8"),
+    ("black_low", "<u8"),
+    ("white_high", "<u4"),
+    ("black_high", "<u4"),
+    ("game", "<u4"),
+    ("king", "u1"),
+    ("turn", "u1"),
+    ("flags", "u1"),
+    ("outcome", "i1"),
+])
+NO_KING = 255
+THRONE_EMPTY = 1
+LOW_MASK = (1 << 64) - 1
+TURN_CODES = {Turn.WHITE: 0, Turn.BLACK: 1}
+TURNS = (Turn.WHITE, Turn.BLACK)
+OUTCOMES = {Turn.WHITEWIN: 1, Turn.BLACKWIN: -1, Turn.DRAW: 0}
+
+
+def record_from_state(state: State, game: int = 0, outcome: int = 0) -> np.ndarray:
+    """
+    Packs one position into a record.
+
+    :param state: A position with white or black to move
+    :param game: Number of the game the position belongs to
+    :param outcome: 1 if white won the game, -1 if black won, 0 for a draw
+    :return: A 0-d array of RECORD_DTYPE
+    """
+    if not isinstance(state, BitboardState):
+        state = BitboardState.from_state(state)
+    record = np.zeros((), dtype=RECORD_DTYPE)
+    record["white_low"] = state.white & LOW_MASK
+    record["white_high"] = state.white >> 64
+    record["black_low"] = state.black & LOW_MASK
+    record["black_high"] = state.black >> 64
+    record["game"] = game
+    record["king"] = state.king.bit_length() - 1 if state.king else NO_KING
+    record["turn"] = TURN_CODES[state.turn]
+    record["flags"] = THRONE_EMPTY if state.throne else 0
+    record["outcome"] = outcome
+    return record
+
+
+def state_from_record(record: np.void) -> BitboardState:
+    """
+    Unpacks a record into a BitboardState (with no repetition history).
+
+    :param record: One element of a RECORD_DTYPE array
+    :return: The position
+    """
+    state = BitboardState()
+    state.white = int(record["white_low"]) | int(record["white_high"]) << 64
+    state.black = int(record["black_low"]) | int(record["black_high"]) << 64
+    king = int(record["king"])
+    state.king = 1 << king if king != NO_KING else 0
+    state.throne = THRONE_BIT if int(record["flags"]) & THRONE_EMPTY else 0
+    state.turn = TURNS[int(record["turn"])]
+    state.reset_history()
+    return state
+
+
+class GameRecordWriter:
+    """
+    Appends games to a record file, creating it if needed.
+
+    :param path: The record file
+    """
+
+    def __init__(self, path: str):
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "ab")
+        if new_file:
+            self.file.write(MAGIC)
+        self.games = 0
+
+    def write_game(self, states: Iterable[State], outcome: int, game: Optional[int] = None):
+        """
+        Appends the positions of one finished game.
+
+        :param states: The positions of the game, with white or black to move
+        :param outcome: 1 if white won, -1 if black won, 0 for a draw
+        :param game: Game number stored in the records (defaults to a counter of this writer)
+        """
+        if game is None:
+            game = self.games
+        records = np.array([record_from_state(state, game, outcome) for state in states], dtype=RECORD_DTYPE)
+        self.file.write(records.tobytes())
+        self.games += 1
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self) -> 'GameRecordWriter':
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+class GameRecordReader:
+    """
+    Memory-mapped, read-only view of a record file.
+
+    :param path: A file written by GameRecordWriter
+    """
+
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a game record file")
+        count = (len(self.data) - len(MAGIC)) // RECORD_DTYPE.itemsize
+        # A view straight into the mapped pages: nothing is read until it is used.
+        self.records = np.frombuffer(self.data, dtype=RECORD_DTYPE, count=count, offset=len(MAGIC))
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def batches(self, batch_size: int) -> Iterator[np.ndarray]:
+        """
+        Yields consecutive slices of the records, which are views and not copies.
+        """
+        for start in range(0, len(self.records), batch_size):
+            yield self.records[start:start + batch_size]
+
+    def states(self) -> Iterator[BitboardState]:
+        for record in self.records:
+            yield state_from_record(record)
+
+    def close(self):
+        # Views into the map must be dropped before it can be closed.
+        self.records = None
+        self.data.close()
+        self.file.close()
+
+
+def _unpack_bitboards(low: np.ndarray, high: np.ndarray) -> np.ndarray:
+    """
+    Expands (N,) low/high bitboard halves into an (N, 81) bool array.
+    """
+    low_bits = np.unpackbits(np.ascontiguousarray(low).view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    high_bits = np.unpackbits(np.ascontiguousarray(high).view(np.uint8).reshape(-1, 4), axis=1, bitorder="little")
+    return np.concatenate([low_bits, high_bits[:, :NUM_SQUARES - 64]], axis=1).astype(bool)
+
+
+def boards_from_records(records: np.ndarray) -> np.ndarray:
+    """
+    Converts records to the (N, 9, 9) int8 pawn-code boards of heuristics.batch_evaluation.
+
+    :param records: An array of RECORD_DTYPE, e.g. a batch from GameRecordReader.batches
+    :return: The boards array
+    """
+    count = len(records)
+    boards = np.zeros((count, NUM_SQUARES), dtype=np.int8)
+    boards[_unpack_bitboards(records["white_low"], records["white_high"])] = WHITE
+    boards[_unpack_bitboards(records["black_low"], records["black_high"])] = BLACK
+    throne_empty = (records["flags"] & THRONE_EMPTY).astype(bool)
+    boards[throne_empty, NUM_SQUARES // 2] = THRONE
+    has_king = records["king"] != NO_KING
+    boards[np.nonzero(has_king)[0], records["king"][has_king]] = KING
+    return boards.reshape(count, BOARD_SIZE, BOARD_SIZE)
+
+
+def main():
+    import random
+    import tempfile
+    import time
+
+    from heuristics.batch_evaluation import boards_from_states
+    from move_generator import generate_moves
+
+    rng = random.Random(0)
+    games: List[List[BitboardState]] = []
+    outcomes = []
+    for _ in range(50):
+        state = BitboardState.initial()
+        positions = []
+        while state.turn in (Turn.WHITE, Turn.BLACK):
+            moves = generate_moves(state)
+            if not moves:
+                break
+            positions.append(BitboardState.from_state(state))
+            state.apply_move(rng.choice(moves))
+        games.append(positions)
+        outcomes.append(OUTCOMES.get(state.turn, 0))
+
+    path = os.path.join(tempfile.mkdtemp(), "games.tgr")
+    with GameRecordWriter(path) as writer:
+        for positions, outcome in zip(games, outcomes):
+            writer.write_game(positions, outcome)
+    reader = GameRecordReader(path)
+    flat = [state for positions in games for state in positions]
+    assert len(reader) == len(flat)
+    assert all(state.to_linear_string() == original.to_linear_string()
+               for state, original in zip(reader.states(), flat))
+    start = time.perf_counter()
+    boards = np.concatenate([boards_from_records(batch) for batch in reader.batches(4096)])
+    elapsed = time.perf_counter() - start
+    assert np.array_equal(boards, boards_from_states(flat))
+    print(f"{len(reader)} positions in {os.path.getsize(path)} bytes round-trip correctly; "
+          f"unpacked to boards in {elapsed * 1000:.1f} ms")
+    reader.close()
+
+
+if __name__ == "__main__":
+    main()
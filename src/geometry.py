@@ -0,0 +1,178 @@
+"""
+Board geometry of Ashton Tablut, precomputed once for the rules, the move generator and
+the heuristics.
+
+Squares are bit indices (row * 9 + column). Every property of a square is available both
+as a bitboard (`*_MASK`, for popcounts against the BitboardState bitboards) and as a flat
+tuple of 81 entries indexed by square (`IS_*` and friends), so the hot paths answer
+"is this square a citadel / an escape / next to the throne" with one lookup instead of
+searching a list of (row, column) pairs.
+"""
+from typing import Iterable, Tuple
+
+BOARD_SIZE = 9
+NUM_SQUARES = BOARD_SIZE * BOARD_SIZE
+FULL_MASK = (1 << NUM_SQUARES) - 1
+
+DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+UP, DOWN, LEFT, RIGHT = range(4)
+
+
+def square(row: int, column: int) -> int:
+    """
+    Converts a (row, column) board position to a bit index.
+
+    :param row: Row index of the position
+    :param column: Column index of the position
+    :return: The index of the square in the bitboards (row * 9 + column)
+    """
+    return row * BOARD_SIZE + column
+
+
+def square_position(sq: int) -> tuple:
+    """
+    Converts a bit index back to a (row, column) board position.
+
+    :param sq: Index of the square in the bitboards
+    :return: A (row, column) tuple
+    """
+    return divmod(sq, BOARD_SIZE)
+
+
+def positions_mask(positions: Iterable[Tuple[int, int]]) -> int:
+    """
+    Builds the bitboard of some (row, column) positions.
+    """
+    mask = 0
+    for row, column in positions:
+        mask |= 1 << square(row, column)
+    return mask
+
+
+def mask_table(mask: int) -> Tuple[bool, ...]:
+    """
+    Expands a bitboard into a tuple of 81 booleans indexed by square.
+    """
+    return tuple(bool(mask >> sq & 1) for sq in range(NUM_SQUARES))
+
+
+def rotate_180(bitboard: int) -> int:
+    """
+    Rotates a bitboard by 180 degrees around the throne: square sq goes to 80 - sq,
+    which reverses the order of the 81 bits.
+    """
+    return int(format(bitboard, "081b")[::-1], 2)
+
+
+THRONE_SQUARE = square(4, 4)
+THRONE_BIT = 1 << THRONE_SQUARE
+
+CAMPS = (
+    ((0, 3), (0, 4), (0, 5), (1, 4)),
+    ((8, 3), (8, 4), (8, 5), (7, 4)),
+    ((3, 0), (4, 0), (5, 0), (4, 1)),
+    ((3, 8), (4, 8), (5, 8), (4, 7)),
+)
+CAMP_MASKS = tuple(positions_mask(camp) for camp in CAMPS)
+CITADEL_MASK = CAMP_MASKS[0] | CAMP_MASKS[1] | CAMP_MASKS[2] | CAMP_MASKS[3]
+# The index of the camp a square belongs to, -1 outside the camps.
+CAMP_OF = tuple(next((index for index, mask in enumerate(CAMP_MASKS) if mask >> sq & 1), -1)
+                for sq in range(NUM_SQUARES))
+
+ESCAPES = (
+    (0, 1), (0, 2), (0, 6), (0, 7),
+    (1, 0), (2, 0), (6, 0), (7, 0),
+    (1, 8), (2, 8), (6, 8), (7, 8),
+    (8, 1), (8, 2), (8, 6), (8, 7),
+)
+ESCAPE_MASK = positions_mask(ESCAPES)
+
+# The outer ring: the game is won by white when the king reaches it (through an escape).
+IS_EDGE = tuple(row in (0, BOARD_SIZE - 1) or column in (0, BOARD_SIZE - 1)
+                for row, column in map(square_position, range(NUM_SQUARES)))
+
+# Squares that act as the second jaw of a capture (besides a friendly piece).
+# The central square of each camp is not hostile to black pawns.
+WHITE_CAPTURE_ANVILS = (CITADEL_MASK | THRONE_BIT) & ~positions_mask(((0, 4), (8, 4), (4, 0), (4, 8)))
+BLACK_CAPTURE_ANVILS = CITADEL_MASK
+
+NEAR_THRONE = ((3, 4), (5, 4), (4, 3), (4, 5))
+
+# Number of black sides needed to capture the king on each square: all 4 on the throne,
+# the 3 free ones next to it, 2 opposite ones anywhere else.
+KING_CAPTURE_SIDES = tuple(4 if sq == THRONE_SQUARE else 3 if square_position(sq) in NEAR_THRONE else 2
+                           for sq in range(NUM_SQUARES))
+
+# Squares next to the throne or in front of a camp, where a capture needs one pawn less.
+NEAR_CITADEL_OR_THRONE = ((4, 2), (4, 6), (2, 4), (6, 4)) + NEAR_THRONE
+NEAR_CITADEL_OR_THRONE_MASK = positions_mask(NEAR_CITADEL_OR_THRONE)
+IS_NEAR_CITADEL_OR_THRONE = mask_table(NEAR_CITADEL_OR_THRONE_MASK)
+
+# The king is safe from quick escapes and captures on the 3x3 block around the throne.
+SAFE_KING_MASK = positions_mask((row, column) for row in range(3, 6) for column in range(3, 6))
+IS_SAFE_KING = mask_table(SAFE_KING_MASK)
+
+# Squares from which a black pawn covers two escapes at once.
+BLOCKED_ESCAPES = (
+    (1, 1), (1, 2), (1, 6), (1, 7), (2, 1), (2, 7),
+    (6, 1), (6, 7), (7, 1), (7, 2), (7, 6), (7, 7),
+)
+BLOCKED_ESCAPES_MASK = positions_mask(BLOCKED_ESCAPES)
+
+# The diagonals black closes around the king (BlackHeuristics).
+RHOMBUS = (
+    (1, 2), (1, 6),
+    (2, 1), (2, 7),
+    (6, 1), (6, 7),
+    (7, 2), (7, 6),
+)
+RHOMBUS_MASK = positions_mask(RHOMBUS)
+
+# Good squares for the white pawns in the opening (WhiteHeuristics).
+BEST_POSITIONS = ((2, 3), (3, 5), (5, 3), (6, 5))
+BEST_POSITIONS_MASK = positions_mask(BEST_POSITIONS)
+
+
+def _on_board(row: int, column: int) -> bool:
+    return 0 <= row < BOARD_SIZE and 0 <= column < BOARD_SIZE
+
+
+# For every square and direction: the adjacent square and the one after it (-1 off the board).
+NEIGHBOURS = tuple(
+    tuple(
+        (
+            square(row + d_row, column + d_column) if _on_board(row + d_row, column + d_column) else -1,
+            square(row + 2 * d_row, column + 2 * d_column) if _on_board(row + 2 * d_row, column + 2 * d_column) else -1,
+        )
+        for d_row, d_column in DIRECTIONS
+    )
+    for row, column in (square_position(sq) for sq in range(NUM_SQUARES))
+)
+
+
+def _build_rays():
+    """
+    Precomputes, for every square and direction, the squares on the ray in order of
+    distance and the bitboard of the ray.
+    """
+    rays = []
+    ray_masks = []
+    for sq in range(NUM_SQUARES):
+        row, column = square_position(sq)
+        sq_rays = []
+        sq_masks = []
+        for d_row, d_column in DIRECTIONS:
+            ray = []
+            r, c = row + d_row, column + d_column
+            while _on_board(r, c):
+                ray.append(square(r, c))
+                r, c = r + d_row, c + d_column
+            sq_rays.append(tuple(ray))
+            sq_masks.append(sum(1 << t for t in ray))
+        rays.append(tuple(sq_rays))
+        ray_masks.append(tuple(sq_masks))
+    return tuple(rays), tuple(ray_masks)
+
+
+# RAYS[sq][direction] lists the squares from sq to the edge; RAY_MASKS holds their bitboards.
+RAYS, RAY_MASKS = _build_rays()
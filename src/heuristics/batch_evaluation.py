@@ -0,0 +1,262 @@
+"""
+Vectorized evaluation of many positions at once with NumPy.
+
+Boards are (N, 9, 9) int8 arrays using the codes below. The features and weighted
+sums are the same as WhiteHeuristics.evaluate_state and BlackHeuristics.evaluate_state,
+computed for all N boards with array operations instead of one Python object per state.
+Positions where the game is over (no king, or the king on the edge) are not meaningful
+inputs for either the scalar or the batch evaluators.
+
+tests/test_batch_evaluation.py checks the batch scores against the scalar classes;
+running this module does the same and also times both:
+    python -m heuristics.batch_evaluation
+"""
+from typing import Iterable
+
+import numpy as np
+
+from bitboard_state import BitboardState
+from geometry import (BEST_POSITIONS_MASK, BOARD_SIZE, DIRECTIONS, IS_NEAR_CITADEL_OR_THRONE, KING_CAPTURE_SIDES,
+                      RHOMBUS_MASK, mask_table)
+from heuristics.black_heuristics import BlackHeuristics
+from heuristics.heuristics import Heuristics
+from heuristics.white_heuristics import WhiteHeuristics
+from state import State, Pawn, Turn
+
+EMPTY, WHITE, BLACK, KING, THRONE = 0, 1, 2, 3, 4
+PAWN_CODES = {Pawn.EMPTY: EMPTY, Pawn.WHITE: WHITE, Pawn.BLACK: BLACK, Pawn.KING: KING, Pawn.THRONE: THRONE}
+
+# The square tables of geometry as (9, 9) arrays, so they can be indexed by whole arrays of rows and columns.
+_BEST_MASK = np.array(mask_table(BEST_POSITIONS_MASK)).reshape(BOARD_SIZE, BOARD_SIZE)
+_RHOMBUS_MASK = np.array(mask_table(RHOMBUS_MASK)).reshape(BOARD_SIZE, BOARD_SIZE)
+_NEAR_CITADEL_OR_THRONE_MASK = np.array(IS_NEAR_CITADEL_OR_THRONE).reshape(BOARD_SIZE, BOARD_SIZE)
+_KING_CAPTURE_SIDES = np.array(KING_CAPTURE_SIDES, dtype=np.int64)
+
+
+def boards_from_states(states: Iterable[State]) -> np.ndarray:
+    """
+    Packs states into an (N, 9, 9) int8 array of pawn codes.
+    Bitboard states are unpacked from their integers; other states are read cell by cell.
+
+    :param states: The states to pack
+    :return: The boards array
+    """
+    states = list(states)
+    boards = np.zeros((len(states), BOARD_SIZE, BOARD_SIZE), dtype=np.int8)
+    for i, state in enumerate(states):
+        if isinstance(state, BitboardState):
+            for bitboard, code in ((state.white, WHITE), (state.black, BLACK),
+                                   (state.king, KING), (state.throne, THRONE)):
+                if bitboard:
+                    bits = np.unpackbits(np.frombuffer(bitboard.to_bytes(11, "little"), dtype=np.uint8),
+                                         bitorder="little")[:BOARD_SIZE * BOARD_SIZE]
+                    boards[i].reshape(-1)[bits.astype(bool)] = code
+        else:
+            for row in range(BOARD_SIZE):
+                for column in range(BOARD_SIZE):
+                    boards[i, row, column] = PAWN_CODES[state.get_pawn(row, column)]
+    return boards
+
+
+def _king_features(boards: np.ndarray):
+    """
+    Locates the king on every board and gathers what both evaluators need around it.
+
+    :return: king rows, king columns, number of sides needed to capture the king,
+             the (N, 4) codes of the four neighbours, and the padded boards
+    """
+    n = boards.shape[0]
+    flat_king = np.argmax(boards.reshape(n, -1) == KING, axis=1)
+    king_rows, king_columns = np.divmod(flat_king, BOARD_SIZE)
+
+    num_eaten = _KING_CAPTURE_SIDES[flat_king]
+
+    # Pad with EMPTY so neighbours of edge squares can be gathered without bounds checks.
+    padded = np.pad(boards, ((0, 0), (1, 1), (1, 1)), constant_values=EMPTY)
+    index = np.arange(n)
+    neighbours = np.stack([padded[index, king_rows + 1 + d_row, king_columns + 1 + d_column]
+                           for d_row, d_column in DIRECTIONS], axis=1)
+    return king_rows, king_columns, num_eaten, neighbours, padded
+
+
+def _win_ways(boards: np.ndarray, king_rows: np.ndarray, king_columns: np.ndarray) -> np.ndarray:
+    """
+    Vectorized Heuristics.count_win_ways: free lines from the king to the edge,
+    counted only when the king is outside the safe zone.
+    """
+    n = boards.shape[0]
+    index = np.arange(n)
+    occupied = (boards != EMPTY).astype(np.int64)
+    row_prefix = np.cumsum(occupied, axis=2)[index, king_rows]
+    column_prefix = np.cumsum(occupied, axis=1)[index, :, king_columns]
+
+    # The king's own square is occupied, hence the "- 1" on the side before it.
+    before_in_row = row_prefix[index, king_columns] - 1
+    after_in_row = row_prefix[:, -1] - row_prefix[index, king_columns]
+    before_in_column = column_prefix[index, king_rows] - 1
+    after_in_column = column_prefix[:, -1] - column_prefix[index, king_rows]
+
+    free_row = (before_in_row == 0).astype(np.int64) + (after_in_row == 0)
+    free_column = (before_in_column == 0).astype(np.int64) + (after_in_column == 0)
+
+    safe = (king_rows > 2) & (king_rows < 6) & (king_columns > 2) & (king_columns < 6)
+    check_column = ~safe & ((king_columns <= 2) | (king_columns >= 6))
+    check_row = ~safe & ((king_rows <= 2) | (king_rows >= 6))
+    return np.where(check_column, free_column, 0) + np.where(check_row, free_row, 0)
+
+
+def _protection_king(padded: np.ndarray, king_rows: np.ndarray, king_columns: np.ndarray,
+                     num_eaten: np.ndarray, neighbours: np.ndarray) -> np.ndarray:
+    """
+    Vectorized WhiteHeuristics.protection_king.
+    """
+    val_near = 0.6
+    val_tot = 1.0
+    n = padded.shape[0]
+    index = np.arange(n)
+    black_near = neighbours == BLACK
+    applies = (black_near.sum(axis=1) == 1) & (num_eaten == 2)
+
+    # The target is the square on the other side of the king from the only black neighbour.
+    enemy_direction = np.argmax(black_near, axis=1)
+    offsets = np.array(DIRECTIONS)
+    target_rows = king_rows - offsets[enemy_direction, 0]
+    target_columns = king_columns - offsets[enemy_direction, 1]
+    target = padded[index, target_rows + 1, target_columns + 1]
+
+    result = np.where(target == WHITE, val_near, 0.0)
+    on_edge = (target_rows == 0) | (target_rows == 8) | (target_columns == 0) | (target_columns == 8)
+
+    inside_rows = np.clip(target_rows, 0, BOARD_SIZE - 1)
+    inside_columns = np.clip(target_columns, 0, BOARD_SIZE - 1)
+    near_citadel = _NEAR_CITADEL_OR_THRONE_MASK[inside_rows, inside_columns]
+    contribution_per_n = (val_tot - val_near) / np.where(near_citadel, 2, 3)
+    white_near_target = sum(
+        (padded[index, target_rows + 1 + d_row, target_columns + 1 + d_column] == WHITE).astype(np.int64)
+        for d_row, d_column in DIRECTIONS)
+    result = np.where(on_edge, np.where(target == EMPTY, 1.0, 0.0),
+                      result + contribution_per_n * white_near_target)
+    return np.where(applies, result, 0.0)
+
+
+def white_features(boards: np.ndarray) -> dict:
+    """
+    Computes the WhiteHeuristics features of every board.
+
+    :param boards: (N, 9, 9) int8 array of pawn codes
+    :return: A dict from feature name to an (N,) float array
+    """
+    boards = np.asarray(boards, dtype=np.int8)
+    white_count = (boards == WHITE).sum(axis=(1, 2))
+    black_count = (boards == BLACK).sum(axis=(1, 2))
+    king_rows, king_columns, num_eaten, neighbours, padded = _king_features(boards)
+    black_near_king = (neighbours == BLACK).sum(axis=1)
+    on_best = ((boards == WHITE) & _BEST_MASK).sum(axis=(1, 2))
+    win_ways = _win_ways(boards, king_rows, king_columns)
+    return {
+        "bestPositions": np.where(white_count >= Heuristics.NUM_WHITE - WhiteHeuristics.THRESHOLD_BEST,
+                                  on_best, 0) / WhiteHeuristics.NUM_BEST_POSITION,
+        "numberOfWhiteAlive": white_count / Heuristics.NUM_WHITE,
+        "numberOfBlackEaten": (Heuristics.NUM_BLACK - black_count) / Heuristics.NUM_BLACK,
+        "blackSurroundKing": (num_eaten - black_near_king) / num_eaten,
+        "protectionKing": _protection_king(padded, king_rows, king_columns, num_eaten, neighbours),
+        "numberOfWinEscapesKing": np.where(win_ways > 1, win_ways / 4, 0.0),
+    }
+
+
+def black_features(boards: np.ndarray) -> dict:
+    """
+    Computes the BlackHeuristics features of every board.
+
+    :param boards: (N, 9, 9) int8 array of pawn codes
+    :return: A dict from feature name to an (N,) float array
+    """
+    boards = np.asarray(boards, dtype=np.int8)
+    white_count = (boards == WHITE).sum(axis=(1, 2))
+    black_count = (boards == BLACK).sum(axis=(1, 2))
+    _, _, num_eaten, neighbours, _ = _king_features(boards)
+    on_rhombus = ((boards == BLACK) & _RHOMBUS_MASK).sum(axis=(1, 2))
+    return {
+        BlackHeuristics.BLACK_ALIVE: black_count / Heuristics.NUM_BLACK,
+        BlackHeuristics.WHITE_EATEN: (Heuristics.NUM_WHITE - white_count) / Heuristics.NUM_WHITE,
+        BlackHeuristics.BLACK_SURROUND_KING: (neighbours == BLACK).sum(axis=1) / num_eaten,
+        BlackHeuristics.RHOMBUS_POSITIONS: np.where(black_count >= BlackHeuristics.THRESHOLD,
+                                                    on_rhombus, 0) / BlackHeuristics.NUM_TILES_ON_RHOMBUS,
+    }
+
+
+def _weighted_sum(features: dict, weights: dict) -> np.ndarray:
+    # Accumulate in the weights' key order, like evaluate_state, so the floats match exactly.
+    n = len(next(iter(features.values())))
+    utility = np.zeros(n, dtype=np.float64)
+    for key in weights:
+        utility += weights[key] * features[key]
+    return utility
+
+
+def evaluate_batch(boards: np.ndarray, color: Turn) -> np.ndarray:
+    """
+    Scores N boards with the heuristics of the given player.
+
+    :param boards: (N, 9, 9) int8 array of pawn codes
+    :param color: Turn.WHITE for WhiteHeuristics scores, Turn.BLACK for BlackHeuristics scores
+    :return: An (N,) float64 array of scores
+    """
+    if color == Turn.WHITE:
+        return _weighted_sum(white_features(boards), WhiteHeuristics(None).weights)
+    return _weighted_sum(black_features(boards), BlackHeuristics(None).weights)
+
+
+def check_parity(states: Iterable[State]) -> float:
+    """
+    Scores the states with both the scalar classes and evaluate_batch.
+
+    :param states: Non-terminal states to compare on
+    :return: The largest absolute difference between the scalar and batch scores
+    """
+    states = list(states)
+    boards = boards_from_states(states)
+    worst = 0.0
+    for color, heuristics_class in ((Turn.WHITE, WhiteHeuristics), (Turn.BLACK, BlackHeuristics)):
+        batch = evaluate_batch(boards, color)
+        scalar = np.array([heuristics_class(state).evaluate_state() for state in states])
+        worst = max(worst, float(np.max(np.abs(batch - scalar))) if len(states) else 0.0)
+    return worst
+
+
+def main():
+    import random
+    import time
+
+    from move_generator import generate_moves
+
+    rng = random.Random(0)
+    states = []
+    for _ in range(100):
+        state = BitboardState.initial()
+        while state.turn in (Turn.WHITE, Turn.BLACK):
+            moves = generate_moves(state)
+            if not moves:
+                break
+            states.append(state.clone())
+            state.apply_move(rng.choice(moves))
+
+    difference = check_parity(states)
+    print(f"{len(states)} positions, largest difference between scalar and batch scores: {difference}")
+    boards = boards_from_states(states)
+    for color, heuristics_class in ((Turn.WHITE, WhiteHeuristics), (Turn.BLACK, BlackHeuristics)):
+        start = time.perf_counter()
+        evaluate_batch(boards, color)
+        batch_time = time.perf_counter() - start
+        start = time.perf_counter()
+        for state in states:
+            heuristics_class(state).evaluate_state()
+        scalar_time = time.perf_counter() - start
+        print(f"{color.name}: batch {batch_time * 1e6 / len(states):.2f} us/position, "
+              f"scalar {scalar_time * 1e6 / len(states):.2f} us/position")
+    if difference > 1e-9:
+        raise SystemExit("batch evaluation does not match the scalar heuristics")
+
+
+if __name__ == "__main__":
+    main()
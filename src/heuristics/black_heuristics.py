@@ -1,6 +1,7 @@
 
+from geometry import RHOMBUS_MASK
 from heuristics.heuristics import Heuristics
-from state import State
+from state import State, Pawn
 
 class BlackHeuristics(Heuristics):
     RHOMBUS_POSITIONS = "rhombusPositions"
@@ -10,24 +11,22 @@ class BlackHeuristics(Heuristics):
 
     THRESHOLD = 10
     NUM_TILES_ON_RHOMBUS = 8
+    RHOMBUS_MASK = RHOMBUS_MASK
+
+    # The built-in weights, before the weights file is applied.
+    DEFAULT_WEIGHTS = {
+        BLACK_ALIVE: 35.0,
+        WHITE_EATEN: 48.0,
+        BLACK_SURROUND_KING: 15.0,
+        RHOMBUS_POSITIONS: 2.0
+    }
 
     def __init__(self, state):
         self.state = state
-        self.weights = {
-            self.BLACK_ALIVE: 35.0,
-            self.WHITE_EATEN: 48.0,
-            self.BLACK_SURROUND_KING: 15.0,
-            self.RHOMBUS_POSITIONS: 2.0
-        }
+        self.weights = dict(self.DEFAULT_WEIGHTS)
+        self.load_configured_weights("black")
         self.keys = list(self.weights.keys())
 
-        self.rhombus = [
-            (1, 2), (1, 6),
-            (2, 1), (2, 7),
-            (6, 1), (6, 7),
-            (7, 2), (7, 6)
-        ]
-
         self.flag = False
         self.number_of_black = 0
         self.number_of_white_eaten = 0
@@ -35,9 +34,10 @@ class BlackHeuristics(Heuristics):
     def evaluate_state(self):
         utility_value = 0.0
 
-        self.number_of_black = self.state.get_number_of("BLACK") / self.NUM_BLACK
-        self.number_of_white_eaten = (self.NUM_WHITE - self.state.get_number_of("WHITE")) / self.NUM_WHITE
-        pawns_near_king = self.check_near_pawns(self.state, self.king_position(self.state), "BLACK") / self.get_num_eaten_positions(self.state)
+        self.number_of_black = self.state.get_number_of(Pawn.BLACK) / self.NUM_BLACK
+        self.number_of_white_eaten = (self.NUM_WHITE - self.state.get_number_of(Pawn.WHITE)) / self.NUM_WHITE
+        king_pos = self.king_position(self.state)
+        pawns_near_king = self.check_near_pawns(self.state, king_pos, Pawn.BLACK.value) / self.get_num_eaten_positions(self.state, king_pos)
         number_of_pawns_on_rhombus = self.get_number_on_rhombus() / self.NUM_TILES_ON_RHOMBUS
 
         if self.flag:
@@ -61,14 +61,10 @@ class BlackHeuristics(Heuristics):
         return utility_value
 
     def get_number_on_rhombus(self):
-        if self.state.get_number_of("BLACK") >= self.THRESHOLD:
+        if self.state.get_number_of(Pawn.BLACK) >= self.THRESHOLD:
             return self.get_values_on_rhombus()
         else:
             return 0
 
     def get_values_on_rhombus(self):
-        count = 0
-        for x, y in self.rhombus:
-            if self.state.get_pawn(x, y) == "BLACK":
-                count += 1
-        return count
+        return self.state.get_number_on(Pawn.BLACK, self.RHOMBUS_MASK)
@@ -0,0 +1,77 @@
+"""
+Bounded LRU cache of heuristic scores in front of a reusable evaluator.
+
+Iterative deepening reaches the same leaves again at every iteration and through
+transpositions, so scores are cached by the canonical Zobrist key of the board (without
+the turn, which the heuristics ignore) together with the color of the evaluator. The
+canonical key is shared by a position and its 180 degree rotation, which the heuristics
+score the same (see symmetry.py), so both take a single entry.
+"""
+from collections import OrderedDict
+
+from bitboard_state import BitboardState
+from heuristics.heuristics import Heuristics
+from symmetry import canonical_key
+from zobrist import TURN_KEYS
+
+DEFAULT_SIZE = 1 << 16
+
+
+class EvaluationCache:
+    """
+    Scores states with one evaluator object, remembering the most recently used scores.
+
+    :param evaluator: A WhiteHeuristics or BlackHeuristics instance, reused for every state
+    :param size: Maximum number of cached scores
+    """
+
+    def __init__(self, evaluator: Heuristics, size: int = DEFAULT_SIZE):
+        self.evaluator = evaluator
+        self.color = type(evaluator).__name__
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def evaluate(self, state: BitboardState) -> float:
+        """
+        Returns the evaluator's score of the state, from the cache if possible.
+
+        :param state: A non-terminal BitboardState
+        :return: The score of evaluate_state
+        """
+        key = (canonical_key(state)[0] ^ TURN_KEYS[state.turn.value], self.color)
+        entries = self.entries
+        score = entries.get(key)
+        if score is not None:
+            self.hits += 1
+            entries.move_to_end(key)
+            return score
+        self.misses += 1
+        evaluator = self.evaluator
+        evaluator.state = state
+        score = evaluator.evaluate_state()
+        entries[key] = score
+        if len(entries) > self.size:
+            entries.popitem(last=False)
+            self.evictions += 1
+        return score
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate(),
+        }
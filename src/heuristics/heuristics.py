@@ -1,5 +1,33 @@
+import json
+import os
 from typing import List, Optional
 
+from bitboard_state import BitboardState
+from geometry import IS_EDGE, IS_SAFE_KING, KING_CAPTURE_SIDES, BLOCKED_ESCAPES_MASK, RAY_MASKS, UP, DOWN, LEFT, RIGHT, square
+from state import Pawn
+
+# Tuned weights, written by tuning.py as {"white": {...}, "black": {...}}. The file is
+# optional: missing weights keep the defaults of WhiteHeuristics and BlackHeuristics.
+WEIGHTS_FILE = os.environ.get("TABLUT_WEIGHTS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "weights.json"))
+_configured_weights = None
+
+
+def configured_weights() -> dict:
+    """
+    Reads WEIGHTS_FILE the first time it is needed.
+
+    :return: The configured weights per color, empty if there is no file
+    """
+    global _configured_weights
+    if _configured_weights is None:
+        if os.path.exists(WEIGHTS_FILE):
+            with open(WEIGHTS_FILE) as weights_file:
+                _configured_weights = json.load(weights_file)
+        else:
+            _configured_weights = {}
+    return _configured_weights
+
+
 class Heuristics:
     NUM_BLACK=16
     NUM_WHITE=8
@@ -11,43 +39,44 @@ class Heuristics:
     def evaluate_state(self) -> float:
         return 0.0
 
+    def load_configured_weights(self, color: str):
+        """
+        Overrides the default weights with those of the weights file, ignoring unknown keys.
+
+        :param color: "white" or "black"
+        """
+        for key, value in configured_weights().get(color, {}).items():
+            if key in self.weights:
+                self.weights[key] = float(value)
+
     def king_position(self, state) -> List[int]:
-        king_pos = [-1, -1]
-        board = state.get_board()
-        for i, row in enumerate(board):
-            for j, pawn in enumerate(row):
-                if state.get_pawn(i, j).equals_pawn("K"):
-                    king_pos = [i, j]
-                    break
-        return king_pos
+        return state.get_king_position()
 
     def check_king_position(self, state) -> bool:
         return state.get_pawn(4, 4).equals_pawn("K")
 
     def check_near_pawns(self, state, position: List[int], target: str) -> int:
-        board = state.get_board()
         count = 0
-        if board[position[0] - 1][position[1]].equals_pawn(target):
+        if state.get_pawn(position[0] - 1, position[1]).equals_pawn(target):
             count += 1
-        if board[position[0] + 1][position[1]].equals_pawn(target):
+        if state.get_pawn(position[0] + 1, position[1]).equals_pawn(target):
             count += 1
-        if board[position[0]][position[1] - 1].equals_pawn(target):
+        if state.get_pawn(position[0], position[1] - 1).equals_pawn(target):
             count += 1
-        if board[position[0]][position[1] + 1].equals_pawn(target):
+        if state.get_pawn(position[0], position[1] + 1).equals_pawn(target):
             count += 1
         return count
 
     def position_near_pawns(self, state, position: List[int], target: str) -> List[List[int]]:
         occupied_positions = []
-        board = state.get_board()
-        
-        if board[position[0] - 1][position[1]].equals_pawn(target):
+
+        if state.get_pawn(position[0] - 1, position[1]).equals_pawn(target):
             occupied_positions.append([position[0] - 1, position[1]])
-        if board[position[0] + 1][position[1]].equals_pawn(target):
+        if state.get_pawn(position[0] + 1, position[1]).equals_pawn(target):
             occupied_positions.append([position[0] + 1, position[1]])
-        if board[position[0]][position[1] - 1].equals_pawn(target):
+        if state.get_pawn(position[0], position[1] - 1).equals_pawn(target):
             occupied_positions.append([position[0], position[1] - 1])
-        if board[position[0]][position[1] + 1].equals_pawn(target):
+        if state.get_pawn(position[0], position[1] + 1).equals_pawn(target):
             occupied_positions.append([position[0], position[1] + 1])
 
         return occupied_positions
@@ -56,20 +85,14 @@ class Heuristics:
         return self.check_near_pawns(state, position, "K") > 0
 
     def get_number_of_blocked_escape(self) -> int:
-        count = 0
-        blocked_escapes = [[1, 1], [1, 2], [1, 6], [1, 7], [2, 1], [2, 7],
-                           [6, 1], [6, 7], [7, 1], [7, 2], [7, 6], [7, 7]]
-        for pos in blocked_escapes:
-            if self.state.get_pawn(pos[0], pos[1]).equals_pawn("BLACK"):
-                count += 1
-        return count
+        return self.state.get_number_on(Pawn.BLACK, BLOCKED_ESCAPES_MASK)
 
     def has_white_won(self) -> bool:
         king_pos = self.king_position(self.state)
-        return king_pos[0] in [0, 8] or king_pos[1] in [0, 8]
+        return king_pos[0] >= 0 and IS_EDGE[square(*king_pos)]
 
     def safe_position_king(self, state, king_position: List[int]) -> bool:
-        return 2 < king_position[0] < 6 and 2 < king_position[1] < 6
+        return king_position[0] >= 0 and IS_SAFE_KING[square(*king_position)]
 
     def king_goes_for_win(self, state) -> bool:
         king_pos = self.king_position(state)
@@ -81,8 +104,9 @@ class Heuristics:
                 row = self.count_free_row(state, king_pos)
         return (col + row) > 0
 
-    def count_win_ways(self, state) -> int:
-        king_pos = self.king_position(state)
+    def count_win_ways(self, state, king_pos: Optional[List[int]] = None) -> int:
+        if king_pos is None:
+            king_pos = self.king_position(state)
         col = row = 0
         if not self.safe_position_king(state, king_pos):
             if king_pos[1] <= 2 or king_pos[1] >= 6:
@@ -92,6 +116,8 @@ class Heuristics:
         return col + row
 
     def count_free_row(self, state, position: List[int]) -> int:
+        if isinstance(state, BitboardState) and position[0] >= 0:
+            return self._count_free_rays(state, position, (LEFT, RIGHT))
         row = position[0]
         column = position[1]
         free_ways = count_right = count_left = 0
@@ -111,6 +137,8 @@ class Heuristics:
         return free_ways
 
     def count_free_column(self, state, position: List[int]) -> int:
+        if isinstance(state, BitboardState) and position[0] >= 0:
+            return self._count_free_rays(state, position, (UP, DOWN))
         row = position[0]
         column = position[1]
         free_ways = count_up = count_down = 0
@@ -129,14 +157,18 @@ class Heuristics:
 
         return free_ways
 
+    def _count_free_rays(self, state: BitboardState, position: List[int], directions: tuple) -> int:
+        # An empty throne counts as occupied, as in check_occupied_position.
+        blocked = state.white | state.black | state.king | state.throne
+        masks = RAY_MASKS[square(*position)]
+        return sum(1 for direction in directions if not masks[direction] & blocked)
+
     def check_occupied_position(self, state, position: List[int]) -> bool:
-        return not state.get_pawn(position[0], position[1]).equals("EMPTY")
+        return not state.get_pawn(position[0], position[1]).equals_pawn(Pawn.EMPTY.value)
 
-    def get_num_eaten_positions(self, state) -> int:
-        king_pos = self.king_position(state)
-        if king_pos == [4, 4]:
-            return 4
-        elif king_pos in [[3, 4], [4, 3], [5, 4], [4, 5]]:
-            return 3
-        else:
+    def get_num_eaten_positions(self, state, king_pos: Optional[List[int]] = None) -> int:
+        if king_pos is None:
+            king_pos = self.king_position(state)
+        if king_pos[0] < 0:
             return 2
+        return KING_CAPTURE_SIDES[square(*king_pos)]
@@ -1,5 +1,6 @@
-from heuristics import Heuristics
-from state import State  # Assuming the existence of a State class similar to Java's structure
+from geometry import BEST_POSITIONS_MASK, IS_NEAR_CITADEL_OR_THRONE, square
+from heuristics.heuristics import Heuristics
+from state import State, Pawn
 
 class WhiteHeuristics(Heuristics):
     """
@@ -7,8 +8,17 @@ class WhiteHeuristics(Heuristics):
     from the perspective of the white player in the game Ashton Tablut.
     """
     THRESHOLD_BEST = 2
-    BEST_POSITIONS = [(2, 3), (3, 5), (5, 3), (6, 5)]
-    NUM_BEST_POSITION = len(BEST_POSITIONS)
+    BEST_POSITIONS_MASK = BEST_POSITIONS_MASK
+    NUM_BEST_POSITION = BEST_POSITIONS_MASK.bit_count()
+    # The built-in weights, before the weights file is applied.
+    DEFAULT_WEIGHTS = {
+        "bestPositions": 2.0,
+        "numberOfBlackEaten": 20.0,
+        "numberOfWhiteAlive": 35.0,
+        "numberOfWinEscapesKing": 18.0,
+        "blackSurroundKing": 7.0,
+        "protectionKing": 18.0
+    }
     
     def __init__(self, state: State):
         """
@@ -16,26 +26,22 @@ class WhiteHeuristics(Heuristics):
         Args:
             state (State): The current state of the game.
         Attributes:
-            weights (dict): A dictionary containing the weights for different heuristic factors.
+            weights (dict): A dictionary containing the weights for different heuristic factors,
+                starting from DEFAULT_WEIGHTS.
                 - "bestPositions": Weight for the best positions heuristic.
                 - "numberOfBlackEaten": Weight for the number of black pieces eaten heuristic.
                 - "numberOfWhiteAlive": Weight for the number of white pieces alive heuristic.
                 - "numberOfWinEscapesKing": Weight for the number of winning escapes for the king heuristic.
                 - "blackSurroundKing": Weight for the black pieces surrounding the king heuristic.
                 - "protectionKing": Weight for the protection of the king heuristic.
+                Values in the "white" section of the weights file (see tuning.py) replace these defaults.
             keys (list): A list of keys from the weights dictionary.
             flag (bool): A flag to enable or disable debug printing.
         """
         
         super().__init__(state)
-        self.weights = {
-            "bestPositions": 2.0,
-            "numberOfBlackEaten": 20.0,
-            "numberOfWhiteAlive": 35.0,
-            "numberOfWinEscapesKing": 18.0,
-            "blackSurroundKing": 7.0,
-            "protectionKing": 18.0
-        }
+        self.weights = dict(self.DEFAULT_WEIGHTS)
+        self.load_configured_weights("white")
         self.keys = list(self.weights.keys())
         self.flag = False  # Flag to enable/disable debug printing
     
@@ -55,13 +61,16 @@ class WhiteHeuristics(Heuristics):
             float: The utility value representing the current state of the game.
         """
         utility_value = 0.0
+        king_pos = self.king_position(self.state)
+        num_eaten_positions = self.get_num_eaten_positions(self.state, king_pos)
+        win_ways = self.count_win_ways(self.state, king_pos)
         values = {
             "bestPositions": self.get_number_on_best_positions() / self.NUM_BEST_POSITION,
-            "numberOfWhiteAlive": self.state.get_number_of(State.Pawn.WHITE) / self.NUM_WHITE,
-            "numberOfBlackEaten": (self.NUM_BLACK - self.state.get_number_of(State.Pawn.BLACK)) / self.NUM_BLACK,
-            "blackSurroundKing": (self.get_num_eaten_positions() - self.check_near_pawns(self.king_position(), State.Pawn.BLACK)) / self.get_num_eaten_positions(),
-            "protectionKing": self.protection_king(),
-            "numberOfWinEscapesKing": self.count_win_ways() / 4 if self.count_win_ways() > 1 else 0.0
+            "numberOfWhiteAlive": self.state.get_number_of(Pawn.WHITE) / self.NUM_WHITE,
+            "numberOfBlackEaten": (self.NUM_BLACK - self.state.get_number_of(Pawn.BLACK)) / self.NUM_BLACK,
+            "blackSurroundKing": (num_eaten_positions - self.check_near_pawns(self.state, king_pos, Pawn.BLACK.value)) / num_eaten_positions,
+            "protectionKing": self.protection_king(king_pos, num_eaten_positions),
+            "numberOfWinEscapesKing": win_ways / 4 if win_ways > 1 else 0.0
         }
 
         for key in self.keys:
@@ -83,20 +92,20 @@ class WhiteHeuristics(Heuristics):
         Returns:
             int: The number of white pawns in the best positions.
         """
-        num = 0
-        if self.state.get_number_of(State.Pawn.WHITE) >= self.NUM_WHITE - self.THRESHOLD_BEST:
-            for pos in self.BEST_POSITIONS:
-                if self.state.get_pawn(*pos) == State.Pawn.WHITE:
-                    num += 1
-        return num
+        if self.state.get_number_of(Pawn.WHITE) >= self.NUM_WHITE - self.THRESHOLD_BEST:
+            return self.state.get_number_on(Pawn.WHITE, self.BEST_POSITIONS_MASK)
+        return 0
     
-    def protection_king(self) -> float:
+    def protection_king(self, king_pos=None, num_eaten_positions=None) -> float:
         """
         Evaluates the protection level of the king in the game.
         This heuristic function calculates a score based on the proximity and 
         positioning of white pawns around the king. The score is influenced by 
         the number of black pawns near the king, the number of positions where 
         pawns have been eaten, and the strategic positioning of white pawns.
+        Args:
+            king_pos (list, optional): The king position, if the caller already knows it.
+            num_eaten_positions (int, optional): The number of sides needed to capture the king, if already known.
         Returns:
             float: A score representing the protection level of the king. 
                The score ranges from 0.0 (no protection) to 1.0 (maximum protection).
@@ -104,21 +113,24 @@ class WhiteHeuristics(Heuristics):
         VAL_NEAR = 0.6
         VAL_TOT = 1.0
         result = 0.0
-        king_pos = self.king_position()
-        pawns_positions = self.position_near_pawns(king_pos, State.Pawn.BLACK)
+        if king_pos is None:
+            king_pos = self.king_position(self.state)
+        if num_eaten_positions is None:
+            num_eaten_positions = self.get_num_eaten_positions(self.state, king_pos)
+        pawns_positions = self.position_near_pawns(self.state, king_pos, Pawn.BLACK.value)
 
-        if len(pawns_positions) == 1 and self.get_num_eaten_positions() == 2:
+        if len(pawns_positions) == 1 and num_eaten_positions == 2:
             enemy_pos = pawns_positions[0]
             target_pos = self.calculate_target_position(king_pos, enemy_pos)
             
-            if self.state.get_pawn(*target_pos) == State.Pawn.WHITE:
+            if self.state.get_pawn(*target_pos) == Pawn.WHITE:
                 result += VAL_NEAR
 
             if target_pos[0] in {0, 8} or target_pos[1] in {0, 8}:
-                result = 1.0 if self.state.get_pawn(*target_pos) == State.Pawn.EMPTY else 0.0
+                result = 1.0 if self.state.get_pawn(*target_pos) == Pawn.EMPTY else 0.0
             else:
                 contribution_per_n = (VAL_TOT - VAL_NEAR) / (2 if self.is_near_citadel_or_throne(target_pos) else 3)
-                result += contribution_per_n * self.check_near_pawns(target_pos, State.Pawn.WHITE)
+                result += contribution_per_n * self.check_near_pawns(self.state, target_pos, Pawn.WHITE.value)
                 
         return result
     
@@ -143,4 +155,4 @@ class WhiteHeuristics(Heuristics):
             return (king_pos[0] + 1, king_pos[1]) if enemy_pos[0] < king_pos[0] else (king_pos[0] - 1, king_pos[1])
     
     def is_near_citadel_or_throne(self, pos):
-        return pos in [(4, 2), (4, 6), (2, 4), (6, 4), (3, 4), (5, 4), (4, 3), (4, 5)]
+        return IS_NEAR_CITADEL_OR_THRONE[square(*pos)]
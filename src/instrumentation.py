@@ -0,0 +1,129 @@
+"""
+Optional per-move instrumentation of the engine and the client, written as a JSONL trace.
+
+Nothing is measured unless an Instrumentation is attached: the engine and the client
+then call timed wrappers instead of the plain functions, so the cost when it is off is
+zero. One JSON line is written for every move played, e.g.
+
+    {"move": 12, "color": "WHITE", "best_move": "e3-h3", "depth": 5, "nodes": 51234,
+     "tt_hit_rate": 0.31, "branching_factor": 27.4, "time_ms": {"movegen": 210.5, ...}}
+
+Time categories:
+- movegen: generate_moves and generate_noisy_moves
+- evaluation: evaluate_state
+- make_unmake: apply_move / undo_move, which include the incremental Zobrist updates
+- hashing: transposition table probes and stores
+- tactics: the king-race solver at the horizon
+- network_send / network_receive: TablutClient framing and socket I/O (receiving
+  includes the wait for the opponent's move)
+"""
+import json
+import time
+from collections import defaultdict
+from typing import Callable
+
+from move_generator import move_string
+
+
+class Instrumentation:
+    """
+    Accumulates timings and counters between two moves and appends a trace line per move.
+
+    :param path: The JSONL file the trace is appended to
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "a")
+        self.times = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.moves_generated = 0
+        self.move_lists = 0
+        self.move_number = 0
+        self._tt_hits = 0
+        self._tt_misses = 0
+
+    def timed(self, category: str, function: Callable) -> Callable:
+        """
+        Wraps a function so its calls and wall time are added to a category.
+
+        :param category: Name of the time category
+        :param function: The function to wrap
+        :return: The wrapper
+        """
+        times = self.times
+        calls = self.calls
+        clock = time.perf_counter
+
+        def wrapper(*args):
+            start = clock()
+            try:
+                return function(*args)
+            finally:
+                times[category] += clock() - start
+                calls[category] += 1
+
+        return wrapper
+
+    def counted_moves(self, function: Callable) -> Callable:
+        """
+        Like `timed` for a move generator, also counting the moves generated so the
+        average branching factor can be reported.
+        """
+        timed = self.timed("movegen", function)
+
+        def wrapper(state):
+            moves = timed(state)
+            self.moves_generated += len(moves)
+            self.move_lists += 1
+            return moves
+
+        return wrapper
+
+    def instrument_client(self, client):
+        """
+        Times the framed socket I/O of a TablutClient.
+        """
+        client._send_frame = self.timed("network_send", client._send_frame)
+        client._receive_frame = self.timed("network_receive", client._receive_frame)
+
+    def record_move(self, result, engine=None, **extra):
+        """
+        Writes the trace line of a move and starts counting the next one.
+
+        :param result: The SearchResult of the move
+        :param engine: The SearchEngine that found it, for the transposition table statistics
+        :param extra: More fields to put in the line
+        """
+        self.move_number += 1
+        record = {
+            "move": self.move_number,
+            "color": engine.color.name if engine is not None else None,
+            "best_move": move_string(result.best_move) if result.best_move is not None else None,
+            "score": result.score,
+            "depth": result.depth,
+            "nodes": result.nodes,
+            "quiescence_nodes": result.quiescence_nodes,
+            "elapsed_ms": result.elapsed * 1000,
+            "nodes_per_second": result.nodes_per_second,
+            "branching_factor": self.moves_generated / self.move_lists if self.move_lists else 0.0,
+            "effective_branching_factor": result.nodes ** (1 / result.depth) if result.depth else 0.0,
+        }
+        if engine is not None:
+            hits = engine.tt.hits - self._tt_hits
+            misses = engine.tt.misses - self._tt_misses
+            record["tt_hit_rate"] = hits / (hits + misses) if hits + misses else 0.0
+            self._tt_hits, self._tt_misses = engine.tt.hits, engine.tt.misses
+        record["time_ms"] = {category: seconds * 1000 for category, seconds in self.times.items()}
+        record["calls"] = dict(self.calls)
+        record.update(extra)
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        self.times.clear()
+        self.calls.clear()
+        self.moves_generated = 0
+        self.move_lists = 0
+
+    def close(self):
+        self.file.close()
+
@@ -0,0 +1,323 @@
+"""
+Monte Carlo tree search (UCT) with heuristic leaf evaluation.
+
+Instead of expanding every move to a fixed depth like the alpha-beta engine, UCT grows
+the tree towards the moves that have scored best so far, which suits the wide trees of
+Tablut (often more than 80 legal moves). A leaf is not played out to the end of the game:
+it is scored by the engine's WhiteHeuristics/BlackHeuristics, relative to the score of
+the root and squashed to a win probability with a logistic function.
+
+The tree is stored in parallel arrays indexed by node number (children of a node are
+contiguous), not in one Python object per node. After a move the subtree of the
+position actually reached is compacted into fresh arrays and searched further; its
+statistics are rescaled to the score of the new root, which the leaf values are
+measured against.
+"""
+import argparse
+import math
+import time
+from array import array
+from typing import List, Optional
+
+from bitboard_state import BitboardState, NUM_SQUARES
+from heuristics.black_heuristics import BlackHeuristics
+from heuristics.evaluation_cache import EvaluationCache
+from heuristics.white_heuristics import WhiteHeuristics
+from move_generator import Move, generate_moves, move_string
+from search import SearchEngine, SearchResult
+from state import State, Turn
+
+EXPLORATION = 1.4
+# Heuristic points that move the leaf value from 0.5 to about 0.73.
+EVAL_SCALE = 5.0
+MAX_NODES = 1 << 21
+# How many playouts are run between two looks at the clock.
+CHECK_INTERVAL = 16
+NO_MOVE = NUM_SQUARES * NUM_SQUARES
+
+
+class MCTSEngine:
+    """
+    Searches Tablut positions for the given player with UCT.
+
+    :param color: The Turn (WHITE or BLACK) of the player the engine plays for
+    :param exploration: UCT exploration constant
+    :param max_nodes: Size of the tree after which leaves are evaluated but no longer expanded
+    :param eval_scale: Heuristic difference from the root that counts as a clear advantage
+    """
+
+    def __init__(self, color: Turn, exploration: float = EXPLORATION, max_nodes: int = MAX_NODES,
+                 eval_scale: float = EVAL_SCALE):
+        self.color = color
+        self.exploration = exploration
+        self.max_nodes = max_nodes
+        self.eval_scale = eval_scale
+        heuristics_class = WhiteHeuristics if color == Turn.WHITE else BlackHeuristics
+        self.heuristics = heuristics_class(None)
+        self.eval_cache = EvaluationCache(self.heuristics)
+        self.root_eval = 0.0
+        self.reused_visits = 0
+        self._clear_tree()
+
+    def _clear_tree(self):
+        # Node 0 is the root. first_child is -1 until the node is expanded.
+        self.parent = array('i', [-1])
+        self.first_child = array('i', [-1])
+        self.child_count = array('i', [0])
+        self.move = array('i', [NO_MOVE])
+        self.visits = array('i', [0])
+        # Sum of the values of the playouts through the node, for the player who moved into it.
+        self.value = array('d', [0.0])
+        # Zobrist key of the node's position, 0 until the node is first reached.
+        self.key = array('Q', [0])
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def search(self, state: State, time_limit: float, max_playouts: Optional[int] = None) -> SearchResult:
+        """
+        Runs playouts until the time limit or the playout limit is reached.
+
+        :param state: The position to search, with the engine's color to move
+        :param time_limit: Seconds available for the search
+        :param max_playouts: Stop after this many playouts, if given
+        :return: A SearchResult whose best move is the most visited root move; `nodes`
+            counts playouts and `depth` is the deepest playout
+        """
+        start = time.monotonic()
+        deadline = start + time_limit
+        state = BitboardState.from_state(state)
+        self.heuristics.state = state
+        root_eval = self.heuristics.evaluate_state()
+        self._reuse_subtree(state.zobrist)
+        if self.reused_visits:
+            self._rescale_values((self.root_eval - root_eval) / self.eval_scale)
+        self.root_eval = root_eval
+        self.key[0] = state.zobrist
+
+        playouts = 0
+        max_depth = 0
+        while max_playouts is None or playouts < max_playouts:
+            if playouts % CHECK_INTERVAL == 0 and time.monotonic() >= deadline and playouts > 0:
+                break
+            max_depth = max(max_depth, self._playout(state))
+            playouts += 1
+
+        result = SearchResult()
+        result.nodes = playouts
+        result.depth = max_depth
+        result.elapsed = time.monotonic() - start
+        result.principal_variation = self._principal_variation()
+        if result.principal_variation:
+            result.best_move = result.principal_variation[0]
+            best = self._best_child(0)
+            result.score = self.value[best] / self.visits[best]
+        else:
+            moves = generate_moves(state)
+            result.best_move = moves[0] if moves else None
+        return result
+
+    def _playout(self, state: BitboardState) -> int:
+        """
+        Selects a leaf, expands it, scores it and backs the score up. Returns the leaf depth.
+        """
+        node = 0
+        path = [0]
+        while self.child_count[node] > 0:
+            node = self._select(node)
+            code = self.move[node]
+            state.apply_move((code // NUM_SQUARES, code % NUM_SQUARES))
+            if not self.key[node]:
+                self.key[node] = state.zobrist
+            path.append(node)
+
+        value = self._leaf_value(state, node)
+        # Nodes at odd depth were reached by a move of the root player.
+        visits = self.visits
+        totals = self.value
+        for depth, visited in enumerate(path):
+            visits[visited] += 1
+            totals[visited] += value if depth % 2 else 1.0 - value
+        for _ in range(len(path) - 1):
+            state.undo_move()
+        return len(path) - 1
+
+    def _leaf_value(self, state: BitboardState, node: int) -> float:
+        """
+        Scores the leaf from the root player's point of view, expanding it if it was visited before.
+        """
+        turn = state.turn
+        if turn == Turn.DRAW:
+            return 0.5
+        if turn == Turn.WHITEWIN or turn == Turn.BLACKWIN:
+            return 1.0 if (turn == Turn.WHITEWIN) == (self.color == Turn.WHITE) else 0.0
+        if self.visits[node] > 0 or node == 0:
+            moves = generate_moves(state)
+            if not moves:
+                # No legal moves loses the game for the side to move.
+                return 0.0 if turn == self.color else 1.0
+            if len(self.parent) + len(moves) <= self.max_nodes:
+                self._expand(node, moves)
+        score = self.eval_cache.evaluate(state)
+        return 1.0 / (1.0 + math.exp(-(score - self.root_eval) / self.eval_scale))
+
+    def _expand(self, node: int, moves: List[Move]):
+        first = len(self.parent)
+        count = len(moves)
+        self.parent.extend([node] * count)
+        self.first_child.extend([-1] * count)
+        self.child_count.extend([0] * count)
+        self.move.extend([from_sq * NUM_SQUARES + to_sq for from_sq, to_sq in moves])
+        self.visits.extend([0] * count)
+        self.value.extend([0.0] * count)
+        self.key.extend([0] * count)
+        self.first_child[node] = first
+        self.child_count[node] = count
+
+    def _select(self, node: int) -> int:
+        """
+        Returns the child with the highest UCB1 score; unvisited children come first.
+        """
+        first = self.first_child[node]
+        end = first + self.child_count[node]
+        visits = self.visits
+        totals = self.value
+        log_visits = math.log(visits[node])
+        exploration = self.exploration
+        best = first
+        best_score = -1.0
+        for child in range(first, end):
+            child_visits = visits[child]
+            if child_visits == 0:
+                return child
+            score = totals[child] / child_visits + exploration * math.sqrt(log_visits / child_visits)
+            if score > best_score:
+                best_score = score
+                best = child
+        return best
+
+    def _best_child(self, node: int) -> int:
+        first = self.first_child[node]
+        return max(range(first, first + self.child_count[node]), key=self.visits.__getitem__)
+
+    def _principal_variation(self) -> List[Move]:
+        pv = []
+        node = 0
+        while self.child_count[node] > 0:
+            node = self._best_child(node)
+            if self.visits[node] == 0:
+                break
+            code = self.move[node]
+            pv.append((code // NUM_SQUARES, code % NUM_SQUARES))
+        return pv
+
+    def _reuse_subtree(self, key: int):
+        """
+        Makes the node of the given position the new root if it is in the tree within
+        two plies of the old root (our move and the opponent's reply), dropping the rest.
+        """
+        self.reused_visits = 0
+        new_root = -1
+        if self.key[0] == key:
+            new_root = 0
+        elif self.child_count[0] > 0:
+            for child in range(self.first_child[0], self.first_child[0] + self.child_count[0]):
+                if self.child_count[child] == 0:
+                    continue
+                first = self.first_child[child]
+                for grandchild in range(first, first + self.child_count[child]):
+                    if self.key[grandchild] == key:
+                        new_root = grandchild
+                        break
+                if new_root >= 0:
+                    break
+        if new_root < 0:
+            self._clear_tree()
+            return
+        if new_root == 0:
+            self.reused_visits = self.visits[0]
+            return
+
+        old = (self.first_child, self.child_count, self.move, self.visits, self.value, self.key)
+        old_first, old_count, old_move, old_visits, old_value, old_key = old
+        self._clear_tree()
+        self.visits[0] = old_visits[new_root]
+        self.value[0] = old_value[new_root]
+        self.key[0] = old_key[new_root]
+        # The children of a node are copied together, so they stay contiguous in the new arrays.
+        queue = [(new_root, 0)]
+        while queue:
+            old_node, new_node = queue.pop()
+            count = old_count[old_node]
+            if count == 0:
+                continue
+            first = len(self.parent)
+            self.first_child[new_node] = first
+            self.child_count[new_node] = count
+            old_start = old_first[old_node]
+            for offset in range(count):
+                old_child = old_start + offset
+                self.parent.append(new_node)
+                self.first_child.append(-1)
+                self.child_count.append(0)
+                self.move.append(old_move[old_child])
+                self.visits.append(old_visits[old_child])
+                self.value.append(old_value[old_child])
+                self.key.append(old_key[old_child])
+                queue.append((old_child, first + offset))
+        self.reused_visits = self.visits[0]
+
+
+    def _rescale_values(self, shift: float):
+        """
+        Converts the statistics of a reused tree to a new root score. A leaf value is
+        sigmoid((score - root_eval) / eval_scale), so measuring it against the new root
+        adds shift = (old root_eval - new root_eval) / eval_scale inside the sigmoid. The
+        mean value of every node is shifted that way (against the opponent's values at
+        even depths), which is exact when all the playouts through the node scored the
+        same leaf and close otherwise; won and lost nodes (mean 0 or 1) are unchanged.
+
+        :param shift: The change of the leaf values' logit
+        """
+        if shift == 0.0:
+            return
+        visits = self.visits
+        totals = self.value
+        parent = self.parent
+        # Parents come before their children in the arrays, so one pass finds the depths.
+        odd = bytearray(len(parent))
+        for node in range(len(parent)):
+            if node:
+                odd[node] = not odd[parent[node]]
+            count = visits[node]
+            if count == 0:
+                continue
+            mean = totals[node] / count
+            if 0.0 < mean < 1.0:
+                logit = math.log(mean / (1.0 - mean)) + (shift if odd[node] else -shift)
+                totals[node] = count / (1.0 + math.exp(-logit))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare MCTS and alpha-beta on the opening under the same time budget.")
+    parser.add_argument("--color", choices=["white", "black"], default="white")
+    parser.add_argument("--time", type=float, default=5.0, help="seconds per move")
+    args = parser.parse_args()
+
+    state = BitboardState.initial()
+    color = Turn.WHITE if args.color == "white" else Turn.BLACK
+    if color == Turn.BLACK:
+        state.apply_move(generate_moves(state)[0])
+
+    mcts = MCTSEngine(color)
+    result = mcts.search(state, args.time)
+    pv = " ".join(move_string(move) for move in result.principal_variation)
+    print(f"mcts: best move {move_string(result.best_move)}, win rate {result.score:.3f}, "
+          f"{result.nodes} playouts ({result.nodes_per_second:.0f}/s), {len(mcts)} nodes, pv {pv}")
+    alpha_beta = SearchEngine(color)
+    result = alpha_beta.search(state, args.time)
+    print(f"alpha-beta: best move {move_string(result.best_move)} ({result})")
+
+
+if __name__ == "__main__":
+    main()
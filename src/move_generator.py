@@ -0,0 +1,205 @@
+"""
+Legal move generation for Ashton Tablut on top of BitboardState.
+
+A move is a (from_square, to_square) tuple of bit indices (row * 9 + column).
+Every piece slides like a rook and the following rules apply:
+- nobody may land on or pass over the throne (the king may only leave it);
+- white pawns and the king may never enter or cross a citadel;
+- a black pawn may move inside the camp it starts in, but once out it can't
+  enter a citadel again, and it can never reach a different camp.
+"""
+import argparse
+import time
+from typing import List, Tuple
+
+from bitboard_state import BitboardState
+from geometry import (BOARD_SIZE, THRONE_BIT, CAMP_MASKS, CAMP_OF, CITADEL_MASK, NEIGHBOURS, ESCAPE_MASK,
+                      WHITE_CAPTURE_ANVILS, BLACK_CAPTURE_ANVILS, RAYS, RAY_MASKS, LEFT, square_position)
+from state import State, Turn
+
+Move = Tuple[int, int]
+
+# UP and LEFT walk towards lower bit indices, so their nearest blocker is the highest set bit.
+_DESCENDING = (True, False, True, False)
+
+
+def _targets(sq: int, blocked: int, moves: List[Move]):
+    """
+    Appends every destination reachable from sq before the first blocked square.
+
+    :param sq: The square of the moving piece
+    :param blocked: Bitboard of the squares the piece can neither land on nor cross
+    :param moves: The list the moves are appended to
+    """
+    rays = RAYS[sq]
+    masks = RAY_MASKS[sq]
+    for direction in range(4):
+        ray = rays[direction]
+        if not ray:
+            continue
+        blockers = masks[direction] & blocked
+        if not blockers:
+            reach = len(ray)
+        else:
+            if _DESCENDING[direction]:
+                nearest = blockers.bit_length() - 1
+            else:
+                nearest = (blockers & -blockers).bit_length() - 1
+            reach = abs(nearest - sq) // (BOARD_SIZE if direction < LEFT else 1) - 1
+        for i in range(reach):
+            moves.append((sq, ray[i]))
+
+
+def generate_moves(state: State) -> List[Move]:
+    """
+    Generates all legal moves for the player whose turn it is.
+    Returns an empty list if the game is over.
+
+    :param state: The state to generate moves for (any State; bitboard states avoid a conversion)
+    :return: A list of (from_square, to_square) moves
+    """
+    if not isinstance(state, BitboardState):
+        state = BitboardState.from_state(state)
+    moves = []
+    occupied = state.white | state.black | state.king | THRONE_BIT
+    if state.turn == Turn.WHITE:
+        blocked = occupied | CITADEL_MASK
+        pieces = state.white | state.king
+        while pieces:
+            low = pieces & -pieces
+            _targets(low.bit_length() - 1, blocked, moves)
+            pieces ^= low
+    elif state.turn == Turn.BLACK:
+        outside_blocked = occupied | CITADEL_MASK
+        camp_blocked = tuple(occupied | (CITADEL_MASK ^ camp_mask) for camp_mask in CAMP_MASKS)
+        pieces = state.black
+        while pieces:
+            low = pieces & -pieces
+            sq = low.bit_length() - 1
+            camp = CAMP_OF[sq]
+            if camp < 0:
+                _targets(sq, outside_blocked, moves)
+            else:
+                _targets(sq, camp_blocked[camp], moves)
+            pieces ^= low
+    return moves
+
+
+def king_moves(state: BitboardState) -> List[Move]:
+    """
+    Generates the moves of the king whoever is to move, e.g. to look for escape threats.
+
+    :param state: The position
+    :return: A list of (from_square, to_square) moves, empty if there is no king
+    """
+    moves = []
+    if state.king:
+        blocked = state.white | state.black | THRONE_BIT | CITADEL_MASK
+        _targets(state.king.bit_length() - 1, blocked, moves)
+    return moves
+
+
+def generate_noisy_moves(state: BitboardState) -> List[Move]:
+    """
+    Generates the moves that change the material or the king race at once: captures
+    for both colors, plus king moves onto an escape or onto a square with an open line
+    to one. These are the moves the quiescence search keeps playing past the horizon.
+
+    :param state: The state to generate moves for
+    :return: A list of (from_square, to_square) moves, captures first
+    """
+    captures = []
+    threats = []
+    if state.turn == Turn.WHITE:
+        anvils = state.white | state.king | WHITE_CAPTURE_ANVILS
+        prey = state.black
+    else:
+        anvils = state.black | BLACK_CAPTURE_ANVILS
+        if not state.king & THRONE_BIT:
+            anvils |= THRONE_BIT
+        prey = state.white | state.king
+    king = state.king
+    for move in generate_moves(state):
+        to_sq = move[1]
+        for adjacent, beyond in NEIGHBOURS[to_sq]:
+            if beyond >= 0 and prey >> adjacent & 1 and anvils >> beyond & 1:
+                captures.append(move)
+                break
+        else:
+            if king >> move[0] & 1:
+                if ESCAPE_MASK >> to_sq & 1:
+                    captures.append(move)
+                    continue
+                reach = []
+                blocked = state.white | state.black | THRONE_BIT | CITADEL_MASK
+                _targets(to_sq, blocked, reach)
+                if any(ESCAPE_MASK >> target & 1 for _, target in reach):
+                    threats.append(move)
+    return captures + threats
+
+
+def next_state(state: BitboardState, move: Move) -> BitboardState:
+    """
+    Returns the state reached by playing a legal move, leaving `state` untouched.
+    Search code should prefer `BitboardState.apply_move`/`undo_move`.
+
+    :param state: The state the move is played from
+    :param move: A (from_square, to_square) move
+    :return: A new BitboardState
+    """
+    child = state.clone()
+    child.apply_move(move)
+    return child
+
+
+def move_string(move: Move) -> str:
+    """
+    Formats a move with the board coordinates used by the server (e.g. 'e3-h3').
+
+    :param move: A (from_square, to_square) move
+    :return: The move as a human-readable string
+    """
+    state = State()
+    return f"{state.get_box(*square_position(move[0]))}-{state.get_box(*square_position(move[1]))}"
+
+
+def perft(state: BitboardState, depth: int) -> int:
+    """
+    Counts the leaf nodes of the legal move tree to the given depth.
+    Finished games are leaves and are not expanded further.
+
+    :param state: The root state
+    :param depth: Number of plies to expand
+    :return: The number of positions reached at the given depth
+    """
+    if depth == 0:
+        return 1
+    moves = generate_moves(state)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        state.apply_move(move)
+        if state.turn in (Turn.WHITE, Turn.BLACK):
+            nodes += perft(state, depth - 1)
+        else:
+            nodes += 1
+        state.undo_move()
+    return nodes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft counts and move-generation speed from the opening position.")
+    parser.add_argument("--depth", type=int, default=3, help="maximum perft depth (1-4)")
+    args = parser.parse_args()
+
+    root = BitboardState.initial()
+    for depth in range(1, args.depth + 1):
+        start = time.perf_counter()
+        nodes = perft(root, depth)
+        elapsed = time.perf_counter() - start
+        print(f"perft({depth}) = {nodes} in {elapsed:.3f}s ({nodes / max(elapsed, 1e-9):.0f} nodes/s)")
+
+
+if __name__ == "__main__":
+    main()
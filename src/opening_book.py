@@ -0,0 +1,158 @@
+"""
+Opening book: best moves for early positions, found offline by deep searches.
+
+The book file is a sorted array of fixed-size little-endian records after a short header:
+
+    header: magic (8 bytes) | number of records (uint64)
+    record: canonical key (uint64) | move (uint16, from * 81 + to) | depth (uint8) | pad | score (float32)
+
+Positions are keyed by the canonical key of symmetry.py and their moves are stored in
+canonical coordinates, so one record answers for a position and its 180 degree rotation.
+
+At startup the player memory-maps the file and finds a position with a binary search
+over the records, so nothing is parsed or loaded up front.
+"""
+import argparse
+import mmap
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+
+from bitboard_state import BitboardState, NUM_SQUARES
+from move_generator import Move, generate_moves, move_string
+from search import SearchEngine
+from state import State, Turn
+from symmetry import canonical_key, from_canonical, to_canonical
+
+MAGIC = b"TBLTBK02"
+HEADER = struct.Struct("<8sQ")
+RECORD = struct.Struct("<QHBxf")
+
+
+class OpeningBook:
+    """
+    Read-only, memory-mapped view of a book file.
+
+    :param path: Path of a file written by `write_book`
+    """
+
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.size = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an opening book")
+
+    def _key_at(self, index: int) -> int:
+        return struct.unpack_from("<Q", self.data, HEADER.size + index * RECORD.size)[0]
+
+    def lookup(self, state: State) -> Optional[Tuple[Move, int, float]]:
+        """
+        Finds the book move of a position.
+
+        :param state: The position, with the player to move
+        :return: (move, depth, score) if the position is in the book, None otherwise
+        """
+        if not isinstance(state, BitboardState):
+            state = BitboardState.from_state(state)
+        key, symmetry = canonical_key(state)
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self.size or self._key_at(low) != key:
+            return None
+        _, move_code, depth, score = RECORD.unpack_from(self.data, HEADER.size + low * RECORD.size)
+        return from_canonical(divmod(move_code, NUM_SQUARES), symmetry), depth, score
+
+    def __len__(self) -> int:
+        return self.size
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+def write_book(path: str, entries: Dict[int, Tuple[Move, int, float]]):
+    """
+    Writes book entries sorted by key.
+
+    :param path: Destination file
+    :param entries: Map from canonical key to (move in canonical coordinates, depth, score)
+    """
+    with open(path, "wb") as book_file:
+        book_file.write(HEADER.pack(MAGIC, len(entries)))
+        for key in sorted(entries):
+            move, depth, score = entries[key]
+            book_file.write(RECORD.pack(key, move[0] * NUM_SQUARES + move[1], min(depth, 255), score))
+
+
+def build_book(time_per_position: float, plies: int, full_plies: int, verbose: bool = True) -> Dict[int, Tuple[Move, int, float]]:
+    """
+    Searches the positions near the start for both colors.
+    For the first `full_plies` plies every legal move is followed, so the book has an
+    answer to any opening move; after that only the book move itself is followed.
+
+    :param time_per_position: Seconds of search for every book position
+    :param plies: Number of plies from the start covered by the book
+    :param full_plies: Number of leading plies in which all moves are expanded
+    :param verbose: Print every entry as it is found
+    :return: Map from canonical key to (move in canonical coordinates, depth, score)
+    """
+    engines = {color: SearchEngine(color) for color in (Turn.WHITE, Turn.BLACK)}
+    entries = {}
+    frontier: List[BitboardState] = [BitboardState.initial()]
+    for ply in range(plies):
+        next_frontier = []
+        for state in frontier:
+            key, symmetry = canonical_key(state)
+            if key in entries:
+                # A symmetric image was already searched and expanded.
+                continue
+            result = engines[state.turn].search(state, time_per_position)
+            if result.best_move is None:
+                continue
+            entries[key] = (to_canonical(result.best_move, symmetry), result.depth, result.score)
+            if verbose:
+                print(f"ply {ply} {state.turn.name}: {move_string(result.best_move)} ({result})")
+            moves = generate_moves(state) if ply < full_plies else [result.best_move]
+            for move in moves:
+                child = state.clone()
+                child.apply_move(move)
+                if child.turn in (Turn.WHITE, Turn.BLACK):
+                    next_frontier.append(BitboardState.from_state(child))
+        frontier = next_frontier
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect an opening book.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="search the opening positions and write a book")
+    build.add_argument("path")
+    build.add_argument("--time", type=float, default=20.0, help="seconds of search per position")
+    build.add_argument("--plies", type=int, default=4, help="plies from the start covered by the book")
+    build.add_argument("--full-plies", type=int, default=1,
+                       help="leading plies in which every legal move is expanded")
+    probe = subparsers.add_parser("probe", help="show the book move of the opening position")
+    probe.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start = time.perf_counter()
+        entries = build_book(args.time, args.plies, args.full_plies)
+        write_book(args.path, entries)
+        print(f"{len(entries)} positions written to {args.path} in {time.perf_counter() - start:.1f}s")
+    else:
+        book = OpeningBook(args.path)
+        entry = book.lookup(BitboardState.initial())
+        print(f"{len(book)} positions; opening move: {move_string(entry[0]) if entry else 'none'}")
+        book.close()
+
+
+if __name__ == "__main__":
+    main()
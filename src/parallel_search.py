@@ -0,0 +1,264 @@
+"""
+Root-parallel search on a process pool.
+
+The root moves are ordered by a shallow single-process search, dealt round-robin to
+the workers, and every worker runs the usual iterative deepening on its share with
+its own transposition table until the common deadline. The move played is the best
+one of the deepest iteration that every worker completed, so all the compared
+scores come from searches of the same depth.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from typing import List, Optional
+
+from bitboard_state import BitboardState
+from instrumentation import Instrumentation
+from move_generator import Move, generate_moves, move_string
+from search import Deadline, SearchEngine, SearchResult, WIN_THRESHOLD
+from state import State, Turn
+
+# Depth and maximum share of the budget of the search that picks the first root move.
+ORDERING_DEPTH = 2
+ORDERING_FRACTION = 0.05
+# Seconds kept aside for collecting the results from the workers.
+COLLECT_MARGIN = 0.2
+# Seconds between two checks of the caller's deadline while the workers search.
+POLL_INTERVAL = 0.01
+
+_worker_engine: Optional[SearchEngine] = None
+_worker_deadline: Optional[Deadline] = None
+
+
+class SharedDeadline(Deadline):
+    """
+    A Deadline in shared memory: the parent process sets it and every worker sees the
+    change at its next look at the clock. time.monotonic() is a system-wide clock, so
+    the same absolute time is valid in all processes.
+
+    :param value: A multiprocessing.Value('d')
+    """
+
+    def __init__(self, value):
+        self.value = value
+        self._lock = value.get_lock()
+
+    @property
+    def at(self) -> float:
+        return self.value.value
+
+    @at.setter
+    def at(self, at: float):
+        self.value.value = at
+
+
+def _init_worker(color: Turn, max_depth: int, tt_size_mb: int, deadline_value):
+    global _worker_engine, _worker_deadline
+    _worker_engine = SearchEngine(color, max_depth=max_depth, tt_size_mb=tt_size_mb)
+    _worker_deadline = SharedDeadline(deadline_value)
+
+
+def _search_share(state: BitboardState, moves: List[Move]) -> SearchResult:
+    return _worker_engine.search(state, 0.0, root_moves=moves, deadline=_worker_deadline)
+
+
+class ParallelSearch:
+    """
+    Splits the root moves of every search across a pool of worker processes. It can be
+    used in place of a SearchEngine by the player: it has the same `search`, `stop`,
+    `stopped`, `instrument` and `tt` (the transposition table of the in-process engine;
+    the workers' tables are not included in its statistics).
+
+    :param color: The Turn (WHITE or BLACK) of the player the engine plays for
+    :param workers: Number of worker processes (defaults to the number of cores)
+    :param max_depth: Depth at which iterative deepening stops even if time is left
+    :param tt_size_mb: Memory cap of each worker's transposition table in megabytes
+    """
+
+    def __init__(self, color: Turn, workers: Optional[int] = None, max_depth: int = 64, tt_size_mb: int = 64):
+        self.color = color
+        self.workers = workers or os.cpu_count() or 1
+        self.max_depth = max_depth
+        self.ordering_engine = SearchEngine(color, max_depth=ORDERING_DEPTH, tt_size_mb=tt_size_mb)
+        self.engine = SearchEngine(color, max_depth=max_depth, tt_size_mb=tt_size_mb)
+        self.tt = self.engine.tt
+        self.deadline = Deadline(0.0)
+        self._stopped = False
+        self.shared_deadline = SharedDeadline(multiprocessing.Value("d", 0.0))
+        self.pool = multiprocessing.Pool(self.workers, initializer=_init_worker,
+                                         initargs=(color, max_depth, tt_size_mb, self.shared_deadline.value))
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped
+
+    @stopped.setter
+    def stopped(self, stopped: bool):
+        self._stopped = stopped
+        self.engine.stopped = stopped
+        self.ordering_engine.stopped = stopped
+
+    def search(self, state: State, time_limit: float, root_moves: Optional[List[Move]] = None,
+               deadline: Optional[Deadline] = None) -> SearchResult:
+        """
+        Searches the state on all workers until the time limit expires.
+
+        :param state: The position to search, with the engine's color to move
+        :param time_limit: Seconds available for the search
+        :param root_moves: Only search these root moves (all legal moves if None)
+        :param deadline: Deadline that replaces time_limit and may be shortened while the search runs
+        :return: A SearchResult whose nodes are the total over all workers
+        """
+        start = time.monotonic()
+        if deadline is None:
+            deadline = Deadline(start + time_limit)
+        self.deadline = deadline
+        state = BitboardState.from_state(state)
+        ordering = self.ordering_engine.search(state, (deadline.at - start) * ORDERING_FRACTION, root_moves)
+        moves = list(root_moves) if root_moves is not None else generate_moves(state)
+        if len(moves) <= 1 or self.workers == 1:
+            return self.engine.search(state, 0.0, moves, deadline)
+
+        if ordering.best_move in moves:
+            moves.remove(ordering.best_move)
+            moves.insert(0, ordering.best_move)
+        shares = [moves[i::self.workers] for i in range(self.workers)]
+        shares = [share for share in shares if share]
+
+        # The workers get the absolute deadline, so time spent queueing and pickling the
+        # jobs counts against the budget instead of being added to it.
+        self.shared_deadline.at = deadline.at - COLLECT_MARGIN
+        pending = [self.pool.apply_async(_search_share, (state, share)) for share in shares]
+        for job in pending:
+            while not job.ready():
+                job.wait(POLL_INTERVAL)
+                if self._stopped:
+                    self.shared_deadline.at = float("-inf")
+                else:
+                    self.shared_deadline.shorten(deadline.at - COLLECT_MARGIN)
+        merged = merge_results([job.get() for job in pending])
+        merged.elapsed = time.monotonic() - start
+        if merged.best_move is None:
+            merged.best_move = ordering.best_move
+        return merged
+
+    def stop(self):
+        """
+        Asks the running search to return as soon as possible, on all workers.
+        """
+        self.stopped = True
+        self.shared_deadline.at = float("-inf")
+
+    def instrument(self, instrumentation: Instrumentation):
+        """
+        Instruments the in-process engines; the workers are not traced.
+        """
+        self.engine.instrument(instrumentation)
+        self.ordering_engine.instrument(instrumentation)
+
+    def close(self):
+        """
+        Stops the worker processes.
+        """
+        self.pool.terminate()
+        self.pool.join()
+
+
+def merge_results(results: List[SearchResult]) -> SearchResult:
+    """
+    Combines the results of searches of disjoint root-move subsets: takes the best
+    move of the deepest iteration completed by all of them.
+
+    A search whose score is proven (a forced win or loss) stops deepening early, but its
+    score holds at any depth, so it does not hold back the depth of the others and its
+    last iteration is compared with their iterations at the common depth.
+
+    :param results: One SearchResult per subset
+    :return: The merged SearchResult
+    """
+    merged = SearchResult()
+    merged.nodes = sum(result.nodes for result in results)
+    merged.quiescence_nodes = sum(result.quiescence_nodes for result in results)
+    proven = [abs(result.score) >= WIN_THRESHOLD and result.depth > 0 for result in results]
+    open_depths = [result.depth for result, is_proven in zip(results, proven) if not is_proven]
+    common_depth = min(open_depths) if open_depths else max((result.depth for result in results), default=0)
+    for result, is_proven in zip(results, proven):
+        candidates = [iteration for iteration in result.iterations if iteration[0] == common_depth]
+        if not candidates and is_proven and result.iterations:
+            candidates = [result.iterations[-1]]
+        for depth, score, move in candidates:
+            if merged.best_move is None or score > merged.score:
+                merged.best_move = move
+                merged.score = score
+                merged.depth = common_depth
+                merged.principal_variation = result.principal_variation if result.depth == depth else [move]
+    return merged
+
+
+def benchmark(positions: List[BitboardState], depth: int, workers: int) -> dict:
+    """
+    Times fixed-depth searches of the same positions with one process and with the pool.
+
+    :param positions: The positions to search
+    :param depth: The depth every search completes
+    :param workers: Number of worker processes
+    :return: A dict with both wall times and the speedup
+    """
+    engines = {color: SearchEngine(color, max_depth=depth) for color in (Turn.WHITE, Turn.BLACK)}
+    start = time.perf_counter()
+    for position in positions:
+        engines[position.turn].search(position, float("inf"))
+    single_time = time.perf_counter() - start
+
+    parallel_time = 0.0
+    for color in (Turn.WHITE, Turn.BLACK):
+        same_color = [position for position in positions if position.turn == color]
+        if not same_color:
+            continue
+        parallel = ParallelSearch(color, workers=workers, max_depth=depth)
+        try:
+            start = time.perf_counter()
+            for position in same_color:
+                parallel.search(position, float("inf"))
+            parallel_time += time.perf_counter() - start
+        finally:
+            parallel.close()
+
+    return {
+        "positions": len(positions),
+        "depth": depth,
+        "workers": workers,
+        "single_seconds": single_time,
+        "parallel_seconds": parallel_time,
+        "speedup": single_time / parallel_time if parallel_time > 0 else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare root-parallel and single-process search.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--depth", type=int, default=3, help="fixed depth of the benchmark searches")
+    parser.add_argument("--time", type=float, default=None,
+                        help="instead of benchmarking, search the opening for this many seconds")
+    args = parser.parse_args()
+
+    if args.time is not None:
+        parallel = ParallelSearch(Turn.WHITE, workers=args.workers)
+        try:
+            result = parallel.search(BitboardState.initial(), args.time)
+        finally:
+            parallel.close()
+        print(f"best move {move_string(result.best_move)} ({result})")
+        return
+
+    opening = BitboardState.initial()
+    reply = opening.clone()
+    reply.apply_move(generate_moves(reply)[0])
+    positions = [opening, reply]
+    print(json.dumps(benchmark(positions, args.depth, args.workers)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+Asyncio player loop on top of TablutClient that ponders during the opponent's turn.
+
+After our move the server sends the state with the opponent to move. The player then
+plays the reply predicted by its principal variation on that state and keeps searching
+the resulting position in a worker thread while it waits for the opponent. When the
+real state arrives:
+- if it is the predicted position, the ponder search simply gets a deadline and its
+  tree, killers, history and transposition table carry on;
+- otherwise the ponder search is stopped at once and a normal search starts, still
+  with the warm transposition table.
+"""
+import argparse
+import asyncio
+import time
+from typing import Optional
+
+from bitboard_state import BitboardState
+from instrumentation import Instrumentation
+from move_generator import generate_moves, move_string
+from opening_book import OpeningBook
+from parallel_search import ParallelSearch
+from search import Deadline, SearchEngine, SearchResult
+from state import State, Turn
+from tablut_client import TablutClient
+
+# Seconds of the server timeout kept for sending the move and network latency.
+TIME_MARGIN = 3.0
+
+
+class AsyncPlayer:
+    """
+    Plays a whole game against the server, pondering on the opponent's time.
+
+    :param client: A connected TablutClient
+    :param engine: The SearchEngine (or ParallelSearch) of our color
+    :param move_time: Seconds to spend on each of our moves
+    :param book: Opening book consulted before searching, if any
+    :param instrumentation: Per-move trace of the engine and the client, if any
+    """
+
+    def __init__(self, client: TablutClient, engine: SearchEngine, move_time: float,
+                 book: Optional[OpeningBook] = None, instrumentation: Optional[Instrumentation] = None):
+        self.client = client
+        self.engine = engine
+        self.book = book
+        self.instrumentation = instrumentation
+        self.color = engine.color
+        self.move_time = move_time
+        self.last_result: Optional[SearchResult] = None
+        self.ponder_task: Optional[asyncio.Future] = None
+        self.ponder_state: Optional[BitboardState] = None
+        self.ponder_deadline: Optional[Deadline] = None
+        # The game so far, so the engine knows which positions would repeat.
+        self.game_state: Optional[BitboardState] = None
+        self.ponder_hits = 0
+        self.ponder_misses = 0
+
+    def _start_search(self, state: BitboardState, deadline: Deadline) -> asyncio.Future:
+        self.engine.stopped = False
+        return asyncio.get_running_loop().run_in_executor(None, self.engine.search, state, 0.0, None, deadline)
+
+    def _start_ponder(self, state: BitboardState):
+        """
+        Starts searching the position after the predicted opponent reply, with no deadline.
+        """
+        result = self.last_result
+        if result is None or len(result.principal_variation) < 2:
+            return
+        predicted = result.principal_variation[1]
+        if predicted not in generate_moves(state):
+            return
+        ponder_state = state.clone()
+        ponder_state.apply_move(predicted)
+        if ponder_state.turn != self.color:
+            return
+        self.ponder_state = ponder_state
+        print(f"Pondering on {move_string(predicted)}")
+        # Created here, before the search thread starts, so a ponder hit can shorten it at any time.
+        self.ponder_deadline = Deadline(float("inf"))
+        self.ponder_task = self._start_search(self.ponder_state, self.ponder_deadline)
+
+    async def _think(self, state: BitboardState) -> SearchResult:
+        """
+        Finds our move: from the opening book if the position is in it, otherwise by
+        search, reusing the ponder search if it predicted this position.
+        """
+        if self.book is not None:
+            entry = self.book.lookup(state)
+            if entry is not None and entry[0] in generate_moves(state):
+                if self.ponder_task is not None:
+                    self.engine.stop()
+                    await self.ponder_task
+                    self.ponder_task = None
+                result = SearchResult()
+                result.best_move, result.depth, result.score = entry
+                result.principal_variation = [result.best_move]
+                return result
+        if self.ponder_task is not None:
+            task, self.ponder_task = self.ponder_task, None
+            if state == self.ponder_state:
+                self.ponder_hits += 1
+                self.ponder_deadline.shorten(time.monotonic() + self.move_time)
+                return await task
+            self.ponder_misses += 1
+            self.engine.stop()
+            await task
+        return await self._start_search(state, Deadline(time.monotonic() + self.move_time))
+
+    def _follow(self, received: State) -> BitboardState:
+        """
+        Brings the game-long state up to the state received from the server by finding
+        the move that leads to it, so the engine keeps the repetition history of the
+        whole game. If no legal move does (the first state, or a state was missed), the
+        game continues from the received state with an empty history.
+        """
+        state = BitboardState.from_state(received)
+        game = self.game_state
+        if state.turn not in (Turn.WHITE, Turn.BLACK):
+            # The game is over (the server may also end it on a board we have already seen).
+            return state
+        if game is not None:
+            if game == state:
+                return game
+            if game.turn in (Turn.WHITE, Turn.BLACK):
+                for move in generate_moves(game):
+                    game.apply_move(move)
+                    if game == state:
+                        return game
+                    game.undo_move()
+            print("Received a state that does not follow from the previous one; repetition history reset")
+        self.game_state = state
+        return state
+
+    async def play(self):
+        """
+        Receives states and answers with moves until the game is over or the connection drops.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            received = await loop.run_in_executor(None, self.client.receive_game_state)
+            if received is None:
+                break
+            state = self._follow(received)
+            if state.turn not in (Turn.WHITE, Turn.BLACK):
+                print(f"Game over: {state.turn.name}")
+                break
+            if state.turn != self.color:
+                if self.ponder_task is None:
+                    self._start_ponder(state)
+                continue
+
+            pondered = self.ponder_task is not None and state == self.ponder_state
+            result = await self._think(state)
+            self.last_result = result
+            if self.instrumentation is not None:
+                self.instrumentation.record_move(result, self.engine, ponder_hit=pondered)
+            print(f"Playing {move_string(result.best_move)} ({result})")
+            from_position = divmod(result.best_move[0], 9)
+            to_position = divmod(result.best_move[1], 9)
+            self.client.send_move(self.client.build_move(from_position, to_position, self.color))
+            state.apply_move(result.best_move)
+
+        if self.ponder_task is not None:
+            self.engine.stop()
+            await self.ponder_task
+        print(f"Ponder hits: {self.ponder_hits}, misses: {self.ponder_misses}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Connect to the Tablut server and play a game.")
+    parser.add_argument("color", choices=["white", "black"])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=None, help="defaults to 5800 for white, 5801 for black")
+    parser.add_argument("--timeout", type=int, default=60, help="server timeout per move in seconds")
+    parser.add_argument("--name", default="python_player")
+    parser.add_argument("--book", default=None, help="opening book built with opening_book.py")
+    parser.add_argument("--trace", default=None, help="append a per-move JSONL instrumentation trace to this file")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="search processes; more than 1 splits the root moves with parallel_search.py")
+    args = parser.parse_args()
+
+    port = args.port or (5800 if args.color == "white" else 5801)
+    client = TablutClient(host=args.host, port=port, player_color=args.color,
+                          timeout=args.timeout + TIME_MARGIN, name=args.name)
+    client.connect()
+    if not client.connected:
+        return
+    color = Turn.WHITE if args.color == "white" else Turn.BLACK
+    # The socket blocks in a worker thread while we ponder, so it must not time out on the opponent.
+    client.socket.settimeout(None)
+    book = OpeningBook(args.book) if args.book else None
+    engine = ParallelSearch(color, workers=args.workers) if args.workers > 1 else SearchEngine(color)
+    instrumentation = Instrumentation(args.trace) if args.trace else None
+    if instrumentation is not None:
+        engine.instrument(instrumentation)
+        instrumentation.instrument_client(client)
+    player = AsyncPlayer(client, engine, max(args.timeout - TIME_MARGIN, 1.0), book, instrumentation)
+    try:
+        asyncio.run(player.play())
+    finally:
+        client.close()
+        if book is not None:
+            book.close()
+        if instrumentation is not None:
+            instrumentation.close()
+        if isinstance(engine, ParallelSearch):
+            engine.close()
+
+
+if __name__ == "__main__":
+    main()
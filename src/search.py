@@ -0,0 +1,481 @@
+"""
+Iterative-deepening negamax search with alpha-beta pruning and a wall-clock deadline.
+
+Leaves are scored with WhiteHeuristics or BlackHeuristics from the point of view of
+the player the engine plays for, and negated at nodes where the opponent is to move.
+Results are stored in a transposition table, whose best move is tried first; then
+come the principal variation of the previous iteration, two killer moves per ply,
+and the remaining moves by the history heuristic.
+
+At the horizon, positions where the king is outside its safe zone are first handed to
+the tactical solver, so forced escapes and captures just past the horizon are scored
+as wins and losses instead of by the heuristics. Other leaves go through a quiescence
+search that keeps playing captures and king escape threats until the position is
+quiet, so a pending capture is not scored as if it could not happen.
+"""
+import argparse
+import threading
+import time
+from typing import List, Optional
+
+from bitboard_state import BitboardState
+from heuristics.black_heuristics import BlackHeuristics
+from heuristics.evaluation_cache import EvaluationCache, DEFAULT_SIZE as EVAL_CACHE_SIZE
+from heuristics.white_heuristics import WhiteHeuristics
+from instrumentation import Instrumentation
+from move_generator import Move, generate_moves, generate_noisy_moves, move_string
+from state import State, Turn
+from symmetry import canonical_key, from_canonical, to_canonical
+from tactics import TacticalSolver
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+
+WIN_SCORE = 100000.0
+MAX_PLY = 128
+# Scores beyond this are wins or losses a number of plies away.
+WIN_THRESHOLD = WIN_SCORE - MAX_PLY
+# How many nodes are searched between two looks at the clock.
+CHECK_INTERVAL = 64
+# Attacker moves the tactical solver looks ahead at the horizon.
+TACTICS_ESCAPE_MOVES = 2
+TACTICS_CAPTURE_MOVES = 1
+# Plies and nodes the quiescence search may add below every horizon node.
+QUIESCENCE_DEPTH = 6
+QUIESCENCE_NODES = 256
+
+
+class Deadline:
+    """
+    The time.monotonic() at which a search must stop. Other threads may bring it
+    forward while the search runs (e.g. when a ponder search gets its real time
+    budget), but never push it back.
+
+    :param at: The initial deadline
+    """
+
+    def __init__(self, at: float):
+        self.at = at
+        self._lock = threading.Lock()
+
+    def shorten(self, at: float):
+        with self._lock:
+            if at < self.at:
+                self.at = at
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside the search when the deadline has passed, to unwind the current iteration.
+    """
+
+
+class SearchResult:
+    """
+    The outcome of a search: the move to play and the statistics of the search.
+    """
+
+    def __init__(self):
+        self.best_move: Optional[Move] = None
+        self.score = 0.0
+        self.depth = 0
+        self.nodes = 0
+        # Nodes of the quiescence search, included in `nodes`
+        self.quiescence_nodes = 0
+        self.elapsed = 0.0
+        self.principal_variation: List[Move] = []
+        # (depth, score, best move) of every completed iteration
+        self.iterations: List[tuple] = []
+
+    @property
+    def nodes_per_second(self) -> float:
+        return self.nodes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        pv = " ".join(move_string(move) for move in self.principal_variation)
+        return (f"depth {self.depth} score {self.score:.2f} nodes {self.nodes} "
+                f"(quiescence {self.quiescence_nodes}) time {self.elapsed:.3f}s nps {self.nodes_per_second:.0f} pv {pv}")
+
+
+class SearchEngine:
+    """
+    Searches Tablut positions for the given player.
+
+    :param color: The Turn (WHITE or BLACK) of the player the engine plays for
+    :param max_depth: Depth at which iterative deepening stops even if time is left
+    :param verbose: Print a line for every completed iteration
+    :param tt_size_mb: Memory cap of the transposition table in megabytes
+    :param use_tactics: Ask the tactical solver about king races at the horizon
+    :param quiescence_nodes: Node budget of the quiescence search below each horizon node (0 disables it)
+    :param weights: Heuristic weights overriding the defaults of the color's heuristics class
+    :param symmetric_tt: Key the transposition table by the canonical form of the position,
+        so a position and its 180 degree rotation (symmetry.SYMMETRIES) share one entry
+    :param eval_cache_size: Number of leaf scores kept in the evaluation cache (0 disables it)
+    """
+
+    def __init__(self, color: Turn, max_depth: int = 64, verbose: bool = False, tt_size_mb: int = 64,
+                 use_tactics: bool = True, quiescence_nodes: int = QUIESCENCE_NODES,
+                 weights: Optional[dict] = None, symmetric_tt: bool = True,
+                 eval_cache_size: int = EVAL_CACHE_SIZE):
+        self.color = color
+        self.weights = weights
+        self.symmetric_tt = symmetric_tt
+        self.quiescence_nodes = quiescence_nodes
+        self.quiescence_budget = 0
+        self.qnodes = 0
+        self.tt = TranspositionTable(tt_size_mb)
+        self.tactics = TacticalSolver() if use_tactics else None
+        self.max_depth = min(max_depth, MAX_PLY - 1)
+        self.verbose = verbose
+        self.heuristics_class = WhiteHeuristics if color == Turn.WHITE else BlackHeuristics
+        # One evaluator for the whole life of the engine, pointed at the searched state.
+        self.heuristics = self.heuristics_class(None)
+        if weights:
+            self.heuristics.weights.update(weights)
+        self.eval_cache = EvaluationCache(self.heuristics, eval_cache_size) if eval_cache_size > 0 else None
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = {}
+        self.nodes = 0
+        self.deadline = Deadline(0.0)
+        self.state = None
+        self.pv_table = [[] for _ in range(MAX_PLY + 1)]
+        self.previous_pv: List[Move] = []
+        self.root_moves: Optional[List[Move]] = None
+        # Set from another thread to abort the running search (see stop()).
+        self.stopped = False
+        # Replaced by timed wrappers while an Instrumentation is attached.
+        self.instrumentation: Optional[Instrumentation] = None
+        self.generate_moves = generate_moves
+        self.generate_noisy_moves = generate_noisy_moves
+
+    def instrument(self, instrumentation: Instrumentation):
+        """
+        Times move generation, evaluation, make/unmake, hashing and tactics from the next search on.
+
+        :param instrumentation: Where the timings are collected
+        """
+        self.instrumentation = instrumentation
+        self.generate_moves = instrumentation.counted_moves(generate_moves)
+        self.generate_noisy_moves = instrumentation.timed("movegen", generate_noisy_moves)
+        self.tt.probe = instrumentation.timed("hashing", self.tt.probe)
+        self.tt.store = instrumentation.timed("hashing", self.tt.store)
+        self.tactical_score = instrumentation.timed("tactics", self.tactical_score)
+        self.heuristics.evaluate_state = instrumentation.timed("evaluation", self.heuristics.evaluate_state)
+
+    def search(self, state: State, time_limit: float, root_moves: Optional[List[Move]] = None,
+               deadline: Optional[Deadline] = None) -> SearchResult:
+        """
+        Searches the state with iterative deepening until the time limit expires.
+        The returned move is the best move of the last iteration that completed;
+        if not even depth 1 completes, the first legal move is returned.
+
+        :param state: The position to search, with the engine's color to move
+        :param time_limit: Seconds available for the search
+        :param root_moves: Only search these root moves (all legal moves if None)
+        :param deadline: Deadline created by the caller, which replaces time_limit and can
+            be shortened from another thread while the search runs
+        :return: The SearchResult with the best move, its score and the search statistics
+        """
+        start = time.monotonic()
+        self.deadline = deadline if deadline is not None else Deadline(start + time_limit)
+        self.state = BitboardState.from_state(state)
+        self.heuristics.state = self.state
+        if self.instrumentation is not None:
+            timed = self.instrumentation.timed
+            self.state.apply_move = timed("make_unmake", self.state.apply_move)
+            self.state.undo_move = timed("make_unmake", self.state.undo_move)
+        self.nodes = 0
+        self.qnodes = 0
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.previous_pv = []
+        self.tt.new_search()
+
+        result = SearchResult()
+        if root_moves is None:
+            root_moves = self.generate_moves(self.state)
+        self.root_moves = list(root_moves)
+        if root_moves:
+            result.best_move = root_moves[0]
+        for depth in range(1, self.max_depth + 1):
+            try:
+                score = self.negamax(depth, 0, -WIN_SCORE - 1, WIN_SCORE + 1)
+            except SearchTimeout:
+                # Unwind whatever the interrupted iteration left on the state.
+                while self.state.undo_log:
+                    self.state.undo_move()
+                break
+            result.depth = depth
+            result.score = score
+            result.principal_variation = list(self.pv_table[0])
+            if result.principal_variation:
+                result.best_move = result.principal_variation[0]
+            result.iterations.append((depth, score, result.best_move))
+            self.previous_pv = result.principal_variation
+            result.nodes = self.nodes
+            result.quiescence_nodes = self.qnodes
+            result.elapsed = time.monotonic() - start
+            if self.verbose:
+                print(result)
+            if abs(score) >= WIN_THRESHOLD or not root_moves:
+                break
+
+        result.nodes = self.nodes
+        result.quiescence_nodes = self.qnodes
+        result.elapsed = time.monotonic() - start
+        return result
+
+    def stop(self):
+        """
+        Asks the running search to return as soon as possible, as if its deadline had passed.
+        The flag stays set until the caller clears `stopped` before the next search.
+        """
+        self.stopped = True
+
+    def clear(self):
+        """
+        Forgets what previous searches learned (transposition table, move-ordering history
+        and caches), so the next search gives the same result as on a new engine.
+        """
+        self.tt.clear()
+        self.history.clear()
+        if self.tactics is not None:
+            self.tactics.cache.clear()
+        if self.eval_cache is not None:
+            self.eval_cache.clear()
+
+    def evaluate(self) -> float:
+        """
+        Scores the current (non-terminal) position from the side to move's point of view.
+        """
+        if self.eval_cache is not None:
+            score = self.eval_cache.evaluate(self.state)
+        else:
+            score = self.heuristics.evaluate_state()
+        return score if self.state.turn == self.color else -score
+
+    def tactical_score(self, ply: int) -> Optional[float]:
+        """
+        Looks for a forced escape or king capture from the current position.
+
+        :param ply: Distance from the root
+        :return: The win or loss score for the side to move if one is proven, None otherwise
+        """
+        state = self.state
+        tactics = self.tactics
+        if state.turn == Turn.WHITE:
+            if tactics.king_escape(state, TACTICS_ESCAPE_MOVES):
+                return WIN_SCORE - (ply + 2 * TACTICS_ESCAPE_MOVES - 1)
+            if tactics.king_capture(state, TACTICS_CAPTURE_MOVES):
+                return -(WIN_SCORE - (ply + 2 * TACTICS_CAPTURE_MOVES))
+        else:
+            if tactics.king_capture(state, TACTICS_CAPTURE_MOVES):
+                return WIN_SCORE - (ply + 2 * TACTICS_CAPTURE_MOVES - 1)
+            if tactics.king_escape(state, TACTICS_ESCAPE_MOVES - 1):
+                return -(WIN_SCORE - (ply + 2 * TACTICS_ESCAPE_MOVES - 2))
+        return None
+
+    def negamax(self, depth: int, ply: int, alpha: float, beta: float) -> float:
+        """
+        Alpha-beta negamax. Scores are from the point of view of the side to move.
+
+        :param depth: Remaining depth in plies
+        :param ply: Distance from the root
+        :param alpha: Lower bound of the window
+        :param beta: Upper bound of the window
+        :return: The score of the position
+        """
+        self.nodes += 1
+        if self.nodes % CHECK_INTERVAL == 0 and (self.stopped or time.monotonic() >= self.deadline.at):
+            raise SearchTimeout()
+        self.pv_table[ply] = []
+
+        state = self.state
+        turn = state.turn
+        if turn != Turn.WHITE and turn != Turn.BLACK:
+            # The player who just moved ended the game, so a win is always a loss for the side to move.
+            return 0.0 if turn == Turn.DRAW else -(WIN_SCORE - ply)
+        if depth == 0:
+            if self.tactics is not None and self.tactics.king_in_danger_zone(state):
+                score = self.tactical_score(ply)
+                if score is not None:
+                    return score
+            if self.quiescence_nodes <= 0:
+                return self.evaluate()
+            self.quiescence_budget = self.quiescence_nodes
+            return self.quiescence(ply, alpha, beta, 0)
+
+        key = state.zobrist
+        symmetry = 0
+        if self.symmetric_tt:
+            key, symmetry = canonical_key(state)
+        tt_move = None
+        entry = self.tt.probe(key)
+        if entry is not None:
+            tt_depth, bound, tt_score, tt_move = entry
+            if symmetry and tt_move is not None:
+                tt_move = from_canonical(tt_move, symmetry)
+            if ply > 0 and tt_depth >= depth:
+                tt_score = _score_from_tt(tt_score, ply)
+                if (bound == EXACT or (bound == LOWER and tt_score >= beta)
+                        or (bound == UPPER and tt_score <= alpha)):
+                    return tt_score
+
+        moves = self.generate_moves(state) if ply > 0 else list(self.root_moves)
+        if not moves:
+            return -(WIN_SCORE - ply)
+        self.order_moves(moves, ply, tt_move)
+
+        original_alpha = alpha
+        best_score = -WIN_SCORE - 1
+        best_move = None
+        history = self.history
+        for move in moves:
+            state.apply_move(move)
+            score = -self.negamax(depth - 1, ply + 1, -beta, -alpha)
+            state.undo_move()
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    self.pv_table[ply] = [move] + self.pv_table[ply + 1]
+                    if score >= beta:
+                        killers = self.killers[ply]
+                        if killers[0] != move:
+                            killers[1] = killers[0]
+                            killers[0] = move
+                        history_key = (turn, move)
+                        history[history_key] = history.get(history_key, 0) + depth * depth
+                        break
+
+        if best_score >= beta:
+            bound = LOWER
+        elif best_score > original_alpha:
+            bound = EXACT
+        else:
+            bound = UPPER
+        if symmetry and best_move is not None:
+            self.tt.store(key, depth, bound, _score_to_tt(best_score, ply), to_canonical(best_move, symmetry))
+        else:
+            self.tt.store(key, depth, bound, _score_to_tt(best_score, ply), best_move)
+        return best_score
+
+    def quiescence(self, ply: int, alpha: float, beta: float, qdepth: int) -> float:
+        """
+        Searches only captures and king escape threats below the horizon. The side to
+        move may always stand pat on the static evaluation instead of playing one.
+
+        :param ply: Distance from the root
+        :param alpha: Lower bound of the window
+        :param beta: Upper bound of the window
+        :param qdepth: Plies already played in the quiescence search
+        :return: The score of the position from the side to move's point of view
+        """
+        self.nodes += 1
+        if qdepth > 0:
+            self.qnodes += 1
+            self.quiescence_budget -= 1
+        if self.nodes % CHECK_INTERVAL == 0 and (self.stopped or time.monotonic() >= self.deadline.at):
+            raise SearchTimeout()
+        self.pv_table[ply] = []
+
+        state = self.state
+        turn = state.turn
+        if turn != Turn.WHITE and turn != Turn.BLACK:
+            return 0.0 if turn == Turn.DRAW else -(WIN_SCORE - ply)
+        best_score = self.evaluate()
+        if (best_score >= beta or qdepth >= QUIESCENCE_DEPTH or ply >= MAX_PLY - 1
+                or self.quiescence_budget <= 0):
+            return best_score
+        if best_score > alpha:
+            alpha = best_score
+
+        for move in self.generate_noisy_moves(state):
+            state.apply_move(move)
+            score = -self.quiescence(ply + 1, -beta, -alpha, qdepth + 1)
+            state.undo_move()
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    self.pv_table[ply] = [move] + self.pv_table[ply + 1]
+                    if score >= beta:
+                        break
+            if self.quiescence_budget <= 0:
+                break
+        return best_score
+
+    def order_moves(self, moves: List[Move], ply: int, tt_move: Optional[Move] = None):
+        """
+        Sorts the moves in place: transposition table move first, then the principal
+        variation move, then killers, then by history score.
+        """
+        pv_move = self.previous_pv[ply] if ply < len(self.previous_pv) else None
+        killer_1, killer_2 = self.killers[ply]
+        history = self.history
+        turn = self.state.turn
+
+        def priority(move):
+            if move == tt_move:
+                return 1 << 41
+            if move == pv_move:
+                return 1 << 40
+            if move == killer_1:
+                return 1 << 39
+            if move == killer_2:
+                return 1 << 38
+            return history.get((turn, move), 0)
+
+        moves.sort(key=priority, reverse=True)
+
+
+def _score_to_tt(score: float, ply: int) -> float:
+    """
+    Makes win/loss scores relative to the node, so they stay valid when the
+    position is reached again at a different distance from the root.
+    """
+    if score >= WIN_THRESHOLD:
+        return score + ply
+    if score <= -WIN_THRESHOLD:
+        return score - ply
+    return score
+
+
+def _score_from_tt(score: float, ply: int) -> float:
+    """
+    Converts a stored win/loss score back to a distance from the current root.
+    """
+    if score >= WIN_THRESHOLD:
+        return score - ply
+    if score <= -WIN_THRESHOLD:
+        return score + ply
+    return score
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search the opening position and report the best move.")
+    parser.add_argument("--color", choices=["white", "black"], default="white")
+    parser.add_argument("--time", type=float, default=5.0, help="seconds per move")
+    parser.add_argument("--trace", default=None, help="append a JSONL instrumentation trace to this file")
+    args = parser.parse_args()
+
+    state = BitboardState.initial()
+    color = Turn.WHITE if args.color == "white" else Turn.BLACK
+    if color == Turn.BLACK:
+        state.apply_move(generate_moves(state)[0])
+    engine = SearchEngine(color, verbose=True)
+    instrumentation = Instrumentation(args.trace) if args.trace else None
+    if instrumentation is not None:
+        engine.instrument(instrumentation)
+    result = engine.search(state, args.time)
+    if instrumentation is not None:
+        instrumentation.record_move(result, engine)
+        instrumentation.close()
+    print(f"best move {move_string(result.best_move)} ({result})")
+    print(f"transposition table: {engine.tt.stats()}")
+    if engine.tactics is not None:
+        print(f"tactical solver: {engine.tactics.stats()}")
+    if engine.eval_cache is not None:
+        print(f"evaluation cache: {engine.eval_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
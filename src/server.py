@@ -0,0 +1,362 @@
+"""
+Local stand-in for the Java tournament server, for load and latency tests of the client.
+
+It speaks the same protocol as the real server: white players connect to one port and
+black players to another, every message is a 4-byte big-endian length followed by UTF-8
+JSON (see tablut_client.HEADER), a player first sends its name, then receives states
+such as {"board": [["EMPTY", ...], ...], "turn": "WHITE"} and answers the states with
+its color to move with {"from": "e3", "to": "h3", "turn": "WHITE"}.
+
+Moves are refereed with the rules of BitboardState and move_generator. A player loses
+if it sends an illegal move, disconnects, or does not answer within the timeout, which
+is recorded as a time-forfeit. The n-th white and the n-th black connection play a
+match together, and any number of matches run concurrently on one event loop:
+
+    python server.py --timeout 10 --matches 8 --log server.jsonl
+
+For every move the log records the response time, from the state leaving the server to
+the move arriving. Compared with the search time in the player's trace (player.py
+--trace), it shows how much of the budget goes to I/O instead of search.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import List, Optional
+
+from bitboard_state import BitboardState
+from geometry import square
+from move_generator import Move, generate_moves, move_string
+from state import Turn
+from tablut_client import HEADER
+
+WHITE_PORT = 5800
+BLACK_PORT = 5801
+DEFAULT_TIMEOUT = 60.0
+# Plies after which a match is stopped and scored as a draw.
+MAX_PLIES = 400
+# Seconds a connected player may take to send its name.
+NAME_TIMEOUT = 10.0
+
+# How a match can end other than on the board.
+TIMEOUT, ILLEGAL_MOVE, DISCONNECTED = "timeout", "illegal_move", "disconnected"
+
+
+class ProtocolError(Exception):
+    """
+    Raised when a player sends something that is not a well-formed move message.
+    """
+
+
+class PlayerConnection:
+    """
+    One connected player.
+
+    :param reader: The stream the player's messages are read from
+    :param writer: The stream the states are written to
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.name = "?"
+        # Resolved by the match when it is over, so the connection handler can return.
+        self.finished = asyncio.get_running_loop().create_future()
+
+    async def receive(self) -> object:
+        """
+        Reads one length-prefixed JSON message.
+        """
+        header = await self.reader.readexactly(HEADER.size)
+        (length,) = HEADER.unpack(header)
+        payload = await self.reader.readexactly(length)
+        return json.loads(payload.decode("utf-8"))
+
+    async def send_state(self, payload: bytes):
+        self.writer.write(payload)
+        await self.writer.drain()
+
+    def close(self):
+        self.writer.close()
+
+
+def state_message(state: BitboardState) -> bytes:
+    """
+    Encodes a state as a framed message in the format of the Java server.
+    """
+    data = {
+        "board": [[pawn.name for pawn in row] for row in state.board],
+        "turn": state.turn.name,
+    }
+    payload = json.dumps(data).encode("utf-8")
+    return HEADER.pack(len(payload)) + payload
+
+
+def parse_move(message: object, turn: Turn) -> Move:
+    """
+    Decodes a move message such as {"from": "e3", "to": "h3", "turn": "WHITE"}.
+
+    :param message: The decoded JSON of the message
+    :param turn: The player expected to move
+    :return: The (from_square, to_square) move
+    :raise ProtocolError: If the message is not a move of that player
+    """
+    try:
+        if message["turn"] != turn.name:
+            raise ProtocolError(f"move for {message['turn']} received on {turn.name}'s turn")
+        squares = []
+        for box in (message["from"], message["to"]):
+            column = ord(box[0].lower()) - ord("a")
+            row = int(box[1:]) - 1
+            if not (0 <= row < 9 and 0 <= column < 9):
+                raise ProtocolError(f"square {box} is off the board")
+            squares.append(square(row, column))
+    except (TypeError, KeyError, IndexError, ValueError) as error:
+        raise ProtocolError(f"malformed move {message!r}") from error
+    return squares[0], squares[1]
+
+
+class MatchRecord:
+    """
+    The outcome and the per-move timings of one match.
+    """
+
+    def __init__(self, match: int, white: str, black: str):
+        self.match = match
+        self.white = white
+        self.black = black
+        self.result: Optional[Turn] = None
+        # TIMEOUT, ILLEGAL_MOVE or DISCONNECTED if the match was not decided on the board
+        self.forfeit: Optional[str] = None
+        self.forfeit_color: Optional[Turn] = None
+        self.plies = 0
+        self.response_times: List[float] = []
+
+    def to_dict(self) -> dict:
+        return {
+            "event": "match",
+            "match": self.match,
+            "white": self.white,
+            "black": self.black,
+            "result": self.result.name if self.result else None,
+            "forfeit": self.forfeit,
+            "forfeit_color": self.forfeit_color.name if self.forfeit_color else None,
+            "plies": self.plies,
+        }
+
+
+class TablutServer:
+    """
+    Pairs white and black connections into matches and referees them.
+
+    :param timeout: Seconds a player has to answer a state with its move
+    :param max_plies: Plies after which a match is scored as a draw
+    :param max_matches: Stop accepting players after this many matches, if given
+    :param log_path: JSONL file receiving one line per move and per match, if given
+    """
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT, max_plies: int = MAX_PLIES,
+                 max_matches: Optional[int] = None, log_path: Optional[str] = None):
+        self.timeout = timeout
+        self.max_plies = max_plies
+        self.max_matches = max_matches
+        self.log = open(log_path, "a") if log_path else None
+        self.waiting = {Turn.WHITE: asyncio.Queue(), Turn.BLACK: asyncio.Queue()}
+        self.records: List[MatchRecord] = []
+        self.matches_started = 0
+        self.tasks = set()
+        self.all_done = asyncio.Event()
+
+    def _write_log(self, entry: dict):
+        if self.log is not None:
+            self.log.write(json.dumps(entry) + "\n")
+            self.log.flush()
+
+    async def _handle(self, color: Turn, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        player = PlayerConnection(reader, writer)
+        try:
+            player.name = str(await asyncio.wait_for(player.receive(), NAME_TIMEOUT))
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            player.close()
+            return
+        await self.waiting[color].put(player)
+        await player.finished
+
+    async def handle_white(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        await self._handle(Turn.WHITE, reader, writer)
+
+    async def handle_black(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        await self._handle(Turn.BLACK, reader, writer)
+
+    async def pair_players(self):
+        """
+        Starts a match for every pair of waiting white and black players, in order of arrival.
+        """
+        while self.max_matches is None or self.matches_started < self.max_matches:
+            white = await self.waiting[Turn.WHITE].get()
+            black = await self.waiting[Turn.BLACK].get()
+            self.matches_started += 1
+            task = asyncio.create_task(self.play_match(self.matches_started, white, black))
+            self.tasks.add(task)
+            task.add_done_callback(self._match_done)
+
+    def _match_done(self, task: asyncio.Task):
+        self.tasks.discard(task)
+        if not self.tasks and self.max_matches is not None and self.matches_started >= self.max_matches:
+            self.all_done.set()
+
+    async def play_match(self, match: int, white: PlayerConnection, black: PlayerConnection) -> MatchRecord:
+        """
+        Referees one match until it ends on the board, by forfeit, or after max_plies.
+        """
+        players = {Turn.WHITE: white, Turn.BLACK: black}
+        record = MatchRecord(match, white.name, black.name)
+        state = BitboardState.initial()
+        try:
+            while True:
+                message = state_message(state)
+                disconnected = await self._broadcast(players, message)
+                if disconnected is not None:
+                    self._forfeit(record, DISCONNECTED, disconnected)
+                    break
+                if state.turn not in (Turn.WHITE, Turn.BLACK):
+                    record.result = state.turn
+                    break
+                if record.plies >= self.max_plies:
+                    state.turn = Turn.DRAW
+                    continue
+                moves = generate_moves(state)
+                if not moves:
+                    # A player who cannot move loses.
+                    state.turn = Turn.BLACKWIN if state.turn == Turn.WHITE else Turn.WHITEWIN
+                    continue
+
+                turn = state.turn
+                sent = time.monotonic()
+                try:
+                    move = parse_move(await asyncio.wait_for(players[turn].receive(), self.timeout), turn)
+                except asyncio.TimeoutError:
+                    self._forfeit(record, TIMEOUT, turn)
+                    break
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    self._forfeit(record, DISCONNECTED, turn)
+                    break
+                except (ProtocolError, ValueError):
+                    self._forfeit(record, ILLEGAL_MOVE, turn)
+                    break
+                response_time = time.monotonic() - sent
+                if move not in moves:
+                    self._forfeit(record, ILLEGAL_MOVE, turn)
+                    break
+                record.response_times.append(response_time)
+                record.plies += 1
+                self._write_log({"event": "move", "match": match, "ply": record.plies, "color": turn.name,
+                                 "player": players[turn].name, "move": move_string(move),
+                                 "response_time": round(response_time, 6)})
+                state.apply_move(move)
+            if record.forfeit is not None:
+                # Tell the players how the match ended, as the Java server does.
+                state.turn = record.result
+                await self._broadcast(players, state_message(state))
+        finally:
+            for player in players.values():
+                player.close()
+                if not player.finished.done():
+                    player.finished.set_result(record)
+        self.records.append(record)
+        self._write_log(record.to_dict())
+        print(f"match {match}: {record.white} - {record.black}: {record.result.name} after {record.plies} plies"
+              + (f" ({record.forfeit_color.name} {record.forfeit})" if record.forfeit else ""))
+        return record
+
+    @staticmethod
+    def _forfeit(record: MatchRecord, reason: str, color: Turn):
+        record.forfeit = reason
+        record.forfeit_color = color
+        record.result = Turn.BLACKWIN if color == Turn.WHITE else Turn.WHITEWIN
+
+    @staticmethod
+    async def _broadcast(players: dict, message: bytes) -> Optional[Turn]:
+        """
+        Sends a state to both players. Returns the color of a player who has gone away, if any.
+        """
+        gone = None
+        for color, player in players.items():
+            try:
+                await player.send_state(message)
+            except ConnectionError:
+                gone = gone or color
+        return gone
+
+    def summary(self) -> dict:
+        """
+        Aggregates the results, forfeits and response times of the finished matches.
+        """
+        times = sorted(t for record in self.records for t in record.response_times)
+        results = [record.result for record in self.records]
+        forfeits = [record for record in self.records if record.forfeit]
+        return {
+            "matches": len(self.records),
+            "white_wins": results.count(Turn.WHITEWIN),
+            "black_wins": results.count(Turn.BLACKWIN),
+            "draws": results.count(Turn.DRAW),
+            "moves": len(times),
+            "time_forfeits": sum(1 for record in forfeits if record.forfeit == TIMEOUT),
+            "illegal_moves": sum(1 for record in forfeits if record.forfeit == ILLEGAL_MOVE),
+            "disconnections": sum(1 for record in forfeits if record.forfeit == DISCONNECTED),
+            "response_time_mean": statistics.fmean(times) if times else 0.0,
+            "response_time_median": statistics.median(times) if times else 0.0,
+            "response_time_p95": times[min(len(times) - 1, int(0.95 * len(times)))] if times else 0.0,
+            "response_time_max": times[-1] if times else 0.0,
+        }
+
+    def close(self):
+        if self.log is not None:
+            self._write_log(dict(event="summary", **self.summary()))
+            self.log.close()
+            self.log = None
+
+
+async def serve(server: TablutServer, host: str, white_port: int, black_port: int):
+    """
+    Listens on both ports until max_matches matches are over (forever if it is None).
+    """
+    white_server = await asyncio.start_server(server.handle_white, host, white_port)
+    black_server = await asyncio.start_server(server.handle_black, host, black_port)
+    print(f"Listening on {host}: white on {white_port}, black on {black_port}, "
+          f"timeout {server.timeout:g}s per move")
+    pairing = asyncio.create_task(server.pair_players())
+    async with white_server, black_server:
+        await server.all_done.wait()
+    pairing.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Referee Tablut matches with the protocol of the tournament server.")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--white-port", type=int, default=WHITE_PORT)
+    parser.add_argument("--black-port", type=int, default=BLACK_PORT)
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="seconds per move")
+    parser.add_argument("--max-plies", type=int, default=MAX_PLIES, help="plies after which a match is a draw")
+    parser.add_argument("--matches", type=int, default=None, help="stop after this many matches (default: run forever)")
+    parser.add_argument("--log", default=None, help="append per-move and per-match JSON lines to this file")
+    args = parser.parse_args()
+
+    async def run() -> TablutServer:
+        server = TablutServer(args.timeout, args.max_plies, args.matches, args.log)
+        try:
+            await serve(server, args.host, args.white_port, args.black_port)
+        finally:
+            server.close()
+        return server
+
+    try:
+        server = asyncio.run(run())
+    except KeyboardInterrupt:
+        return
+    print(json.dumps(server.summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
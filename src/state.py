@@ -2,6 +2,9 @@ from enum import Enum
 from typing import List, Optional
 from copy import deepcopy
 
+from geometry import BOARD_SIZE, NUM_SQUARES
+from zobrist import hash_board
+
 class Turn(Enum):
     """
     Enum representing the possible game turns and end states.
@@ -157,10 +160,12 @@ class State:
     def __hash__(self) -> int:
         """
         Generates a hash code for the state based on the board and turn.
+        This is the Zobrist key of the position (see zobrist.py), so a State and a
+        BitboardState holding the same position hash the same.
 
         :return: Hash code of the state
         """
-        return hash((str(self.board), self.turn))
+        return hash_board(self.board, self.turn)
 
     def get_box(self, row: int, column: int) -> str:
         """
@@ -192,3 +197,27 @@ class State:
         :return: The number of cells containing the specified pawn type
         """
         return sum(pawn == color for row in self.board for pawn in row)
+
+    def get_number_on(self, color: Pawn, mask: int) -> int:
+        """
+        Counts how many of the given squares contain a specific pawn type.
+
+        :param color: The Pawn type to count (e.g., WHITE, BLACK)
+        :param mask: A bitboard of the squares, one of the *_MASK constants of geometry
+        :return: The number of those squares containing the specified pawn type
+        """
+        board = self.board
+        return sum(board[sq // BOARD_SIZE][sq % BOARD_SIZE] == color
+                   for sq in range(NUM_SQUARES) if mask >> sq & 1)
+
+    def get_king_position(self) -> List[int]:
+        """
+        Finds the king on the board.
+
+        :return: The [row, column] of the king, or [-1, -1] if there is no king
+        """
+        for i, row in enumerate(self.board):
+            for j, pawn in enumerate(row):
+                if pawn == Pawn.KING:
+                    return [i, j]
+        return [-1, -1]
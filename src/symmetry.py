@@ -0,0 +1,212 @@
+"""
+Board symmetry of Tablut: canonical forms of positions for cache keys.
+
+The rules of the board (throne, camps, escapes) are unchanged by all 8 rotations and
+reflections of D4, but the evaluation is not. WhiteHeuristics rewards white pawns on
+BEST_POSITIONS, ((2, 3), (3, 5), (5, 3), (6, 5)), which the 90 and 270 degree
+rotations, the two mirrors and the two diagonal reflections all move onto other
+squares. Positions related by those six would get different scores, so a cache shared
+between them would return wrong values. Positions are therefore only identified under
+SYMMETRIES, the transformations that leave every square set of the rules and the
+heuristics in place: the identity and the 180 degree rotation. A cache keyed by
+`canonical_key` stores a position and its rotation in one entry, which halves the
+entries of positions that differ from their rotation; moves are stored in canonical
+coordinates with `to_canonical` and mapped back with `from_canonical`.
+
+BitboardState keeps the Zobrist key of its rotation (`zobrist_180`) up to date next
+to its own, so the canonical key is the smaller of the two keys and costs no more
+than a comparison. The square-permutation tables of all 8 transformations and the
+row lookup tables that transform bitboards are kept for moves and the self-check.
+"""
+from typing import List, Tuple
+
+from bitboard_state import BitboardState, BOARD_SIZE, NUM_SQUARES
+from geometry import (BEST_POSITIONS_MASK, BLOCKED_ESCAPES_MASK, CITADEL_MASK, ESCAPE_MASK,
+                      NEAR_CITADEL_OR_THRONE_MASK, RHOMBUS_MASK, SAFE_KING_MASK, THRONE_BIT)
+from move_generator import Move
+from zobrist import hash_bitboards
+
+LAST = BOARD_SIZE - 1
+
+# The 8 elements of D4 acting on (row, column).
+TRANSFORMS = (
+    lambda row, column: (row, column),                 # identity
+    lambda row, column: (column, LAST - row),          # rotation by 90 degrees
+    lambda row, column: (LAST - row, LAST - column),   # rotation by 180 degrees
+    lambda row, column: (LAST - column, row),          # rotation by 270 degrees
+    lambda row, column: (row, LAST - column),          # horizontal mirror
+    lambda row, column: (LAST - row, column),          # vertical mirror
+    lambda row, column: (column, row),                 # main diagonal
+    lambda row, column: (LAST - column, LAST - row),   # anti-diagonal
+)
+NUM_TRANSFORMS = len(TRANSFORMS)
+
+# SQUARE_MAPS[t][sq] is the square sq is sent to by transformation t.
+SQUARE_MAPS: Tuple[Tuple[int, ...], ...] = tuple(
+    tuple(row * BOARD_SIZE + column for row, column in
+          (transform(*divmod(sq, BOARD_SIZE)) for sq in range(NUM_SQUARES)))
+    for transform in TRANSFORMS
+)
+# INVERSE[t] undoes transformation t.
+INVERSE = tuple(
+    next(u for u in range(NUM_TRANSFORMS)
+         if all(SQUARE_MAPS[u][SQUARE_MAPS[t][sq]] == sq for sq in range(NUM_SQUARES)))
+    for t in range(NUM_TRANSFORMS)
+)
+
+
+def _build_row_tables() -> List[List[Tuple[int, ...]]]:
+    """
+    For every transformation and board row, the image of each of the 512 contents of the row.
+    """
+    tables = []
+    for square_map in SQUARE_MAPS:
+        rows = []
+        for row in range(BOARD_SIZE):
+            images = []
+            for content in range(1 << BOARD_SIZE):
+                image = 0
+                for column in range(BOARD_SIZE):
+                    if content >> column & 1:
+                        image |= 1 << square_map[row * BOARD_SIZE + column]
+                images.append(image)
+            rows.append(tuple(images))
+        tables.append(rows)
+    return tables
+
+
+_ROW_TABLES = _build_row_tables()
+_ROW_MASK = (1 << BOARD_SIZE) - 1
+
+
+def transform_bitboard(bitboard: int, t: int) -> int:
+    """
+    Applies transformation t to a bitboard.
+    """
+    if t == 0 or not bitboard:
+        return bitboard
+    tables = _ROW_TABLES[t]
+    image = 0
+    row = 0
+    while bitboard:
+        content = bitboard & _ROW_MASK
+        if content:
+            image |= tables[row][content]
+        bitboard >>= BOARD_SIZE
+        row += 1
+    return image
+
+
+# The square sets the rules and the evaluation depend on.
+_EVALUATED_MASKS = (THRONE_BIT, CITADEL_MASK, ESCAPE_MASK, NEAR_CITADEL_OR_THRONE_MASK, SAFE_KING_MASK,
+                    BLOCKED_ESCAPES_MASK, RHOMBUS_MASK, BEST_POSITIONS_MASK)
+# The transformations that preserve the evaluation, under which positions are identified.
+SYMMETRIES = tuple(t for t in range(NUM_TRANSFORMS)
+                   if all(transform_bitboard(mask, t) == mask for mask in _EVALUATED_MASKS))
+ROTATION_180 = 2
+# canonical_key only knows the keys of BitboardState: the state's and its rotation's.
+assert SYMMETRIES == (0, ROTATION_180)
+
+
+def transform_move(move: Move, t: int) -> Move:
+    """
+    Applies transformation t to a (from_square, to_square) move.
+    """
+    square_map = SQUARE_MAPS[t]
+    return square_map[move[0]], square_map[move[1]]
+
+
+def canonical_transform(state: BitboardState) -> int:
+    """
+    Finds the transformation of SYMMETRIES that sends the state to its canonical image:
+    the one of the state and its 180 degree rotation with the smaller Zobrist key.
+
+    :param state: The position
+    :return: The index of the transformation in TRANSFORMS
+    """
+    return 0 if state.zobrist <= state.zobrist_180 else ROTATION_180
+
+
+def canonical_key(state: BitboardState) -> Tuple[int, int]:
+    """
+    Returns the Zobrist key of the canonical image of the state, shared by the state
+    and its 180 degree rotation.
+
+    :param state: The position
+    :return: (canonical key, transformation from the state to its canonical image)
+    """
+    if state.zobrist <= state.zobrist_180:
+        return state.zobrist, 0
+    return state.zobrist_180, ROTATION_180
+
+
+def to_canonical(move: Move, t: int) -> Move:
+    """
+    Maps a move of the state into the coordinates of its canonical image.
+    """
+    return transform_move(move, t)
+
+
+def from_canonical(move: Move, t: int) -> Move:
+    """
+    Maps a move stored in canonical coordinates back to the state's coordinates.
+    """
+    return transform_move(move, INVERSE[t])
+
+
+def main():
+    import random
+    import time
+
+    from heuristics.black_heuristics import BlackHeuristics
+    from heuristics.white_heuristics import WhiteHeuristics
+    from move_generator import generate_moves
+    from state import Turn
+
+    rng = random.Random(0)
+    states = []
+    state = BitboardState.initial()
+    while len(states) < 2000:
+        moves = generate_moves(state)
+        if not moves or state.turn not in (Turn.WHITE, Turn.BLACK):
+            state = BitboardState.initial()
+            continue
+        state.apply_move(rng.choice(moves))
+        if state.turn in (Turn.WHITE, Turn.BLACK):
+            states.append(BitboardState.from_state(state))
+
+    # Every image of a position under SYMMETRIES must have the same canonical key, and any
+    # two images that share a key, under any of the 8 transformations, must have the same
+    # evaluation for both colors and the same moves.
+    for state in states[:200]:
+        # The key of the rotation kept along the moves matches the one computed from scratch.
+        assert state.zobrist_180 == hash_bitboards(*(transform_bitboard(bitboard, ROTATION_180)
+                                                     for bitboard in (state.white, state.black, state.king)),
+                                                   state.throne, state.turn)
+        key, t = canonical_key(state)
+        moves = sorted(to_canonical(move, t) for move in generate_moves(state))
+        values = (WhiteHeuristics(state).evaluate_state(), BlackHeuristics(state).evaluate_state())
+        for u in range(NUM_TRANSFORMS):
+            image = BitboardState.from_state(state)
+            image.white, image.black, image.king = (transform_bitboard(state.white, u),
+                                                    transform_bitboard(state.black, u),
+                                                    transform_bitboard(state.king, u))
+            image.reset_history()
+            image_key, image_t = canonical_key(image)
+            assert image_key == key or u not in SYMMETRIES
+            if image_key != key:
+                continue
+            assert (WhiteHeuristics(image).evaluate_state(), BlackHeuristics(image).evaluate_state()) == values
+            assert sorted(to_canonical(move, image_t) for move in generate_moves(image)) == moves
+            assert all(from_canonical(to_canonical(move, image_t), image_t) == move
+                       for move in generate_moves(image))
+
+    start = time.perf_counter()
+    for state in states:
+        canonical_key(state)
+    elapsed = time.perf_counter() - start
+    print(f"symmetry checks passed; canonical_key: {elapsed / len(states) * 1e6:.1f} us/call")
+
+
+if __name__ == "__main__":
+    main()
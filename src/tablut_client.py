@@ -1,14 +1,24 @@
 import socket
 import json
+import struct
+
+from state import State, Pawn, Turn
+
+# Every message is a 4-byte big-endian length followed by that many bytes of UTF-8 JSON,
+# as written by the Java server's DataOutputStream.writeInt / write.
+HEADER = struct.Struct('>i')
+INITIAL_BUFFER_SIZE = 4096
 
 class TablutClient:
-    def __init__(self, host='localhost', port=5800, player_color='white', timeout=60):
+    def __init__(self, host='localhost', port=5800, player_color='white', timeout=60, name='python_player'):
         """
         Initialize a Tablut client to connect to the Java server.
         Parameters:
             host (str): The server's hostname or IP address.
             port (int): The server's port number.
             player_color (str): Player color ('white' or 'black').
+            timeout (int): Socket timeout in seconds.
+            name (str): Player name sent to the server when connecting.
         """
         self.host = host
         self.port = port
@@ -16,46 +26,106 @@ class TablutClient:
         self.socket = None
         self.connected = False
         self.timeout = timeout
+        self.name = name
+        # Reused for every received message; frames are read straight into it.
+        self._buffer = bytearray(INITIAL_BUFFER_SIZE)
+        self._header = bytearray(HEADER.size)
 
     def connect(self):
-        """Connect to the Java server."""
+        """Connect to the Java server and send the player name."""
         try:
             self.socket = socket.create_connection((self.host, self.port), timeout=self.timeout)
             self.connected = True
             print(f"Connected to server on port {self.port} as {self.player_color}.")
+            self._send_frame(json.dumps(self.name).encode('utf-8'))
         except socket.error as e:
             print(f"Error connecting to server: {e}")
             self.connected = False
 
+    def _send_frame(self, payload: bytes):
+        """Send one length-prefixed message."""
+        self.socket.sendall(HEADER.pack(len(payload)) + payload)
+
+    def _receive_into(self, view: memoryview):
+        """Fill the whole view from the socket, across as many TCP segments as needed."""
+        received = 0
+        while received < len(view):
+            count = self.socket.recv_into(view[received:])
+            if count == 0:
+                raise ConnectionError("Server closed the connection.")
+            received += count
+
+    def _receive_frame(self) -> memoryview:
+        """Receive one length-prefixed message into the reusable buffer and return a view of it."""
+        self._receive_into(memoryview(self._header))
+        (length,) = HEADER.unpack(self._header)
+        if length > len(self._buffer):
+            self._buffer = bytearray(max(length, 2 * len(self._buffer)))
+        view = memoryview(self._buffer)[:length]
+        self._receive_into(view)
+        return view
+
     def send_move(self, move_data):
         """Send move data as JSON to the server."""
         if not self.connected:
             raise ConnectionError("Client is not connected to the server.")
-        
+
         try:
             json_data = json.dumps(move_data)
-            self.socket.sendall(json_data.encode('utf-8'))
+            self._send_frame(json_data.encode('utf-8'))
             print(f"Sent move: {json_data}")
         except socket.error as e:
             print(f"Error sending move data: {e}")
 
+    def build_move(self, from_position, to_position, turn: Turn) -> dict:
+        """
+        Build the action message expected by the server.
+        Parameters:
+            from_position (tuple): (row, column) of the piece to move.
+            to_position (tuple): (row, column) of the destination.
+            turn (Turn): The player making the move.
+        Returns:
+            dict: The move data for send_move, e.g. {'from': 'e3', 'to': 'h3', 'turn': 'WHITE'}.
+        """
+        state = State()
+        return {
+            'from': state.get_box(*from_position),
+            'to': state.get_box(*to_position),
+            'turn': turn.name,
+        }
+
     def receive_game_state(self):
-        """Receive game state from the server and decode JSON."""
+        """Receive the next game state from the server and decode it into a State."""
         if not self.connected:
             raise ConnectionError("Client is not connected to the server.")
-        
+
         try:
-            data = self.socket.recv(4096).decode('utf-8')
-            game_state = json.loads(data)
-            print(f"Received game state: {game_state}")
+            game_state = self.parse_state(self._receive_frame())
+            print(f"Received game state:\n{game_state}")
             return game_state
-        except socket.error as e:
+        except (socket.error, ConnectionError) as e:
             print(f"Error receiving game state: {e}")
+            self.connected = False
             return None
-        except json.JSONDecodeError as e:
+        except (ValueError, KeyError) as e:
             print(f"Error decoding JSON data: {e}")
             return None
 
+    @staticmethod
+    def parse_state(payload) -> State:
+        """
+        Decode a state message from the server.
+        Parameters:
+            payload (bytes-like): UTF-8 JSON such as {"board": [["EMPTY", ...], ...], "turn": "WHITE"}.
+        Returns:
+            State: The decoded state.
+        """
+        data = json.loads(str(payload, 'utf-8'))
+        state = State()
+        state.set_board([[Pawn[name] for name in row] for row in data['board']])
+        state.set_turn(Turn[data['turn']])
+        return state
+
     def close(self):
         """Close the connection to the server."""
         if self.socket:
@@ -71,13 +141,10 @@ if __name__ == "__main__":
     client = TablutClient(port=port, player_color=player_color)
     client.connect()
 
-    # Example move data
-    move_data = {
-        'from': {'row': 1, 'col': 1},
-        'to': {'row': 2, 'col': 2}
-    }
+    game_state = client.receive_game_state()
 
+    # Example move: the white pawn on e3 moves to h3
+    move_data = client.build_move((2, 4), (2, 7), Turn.WHITE)
     client.send_move(move_data)
-    game_state = client.receive_game_state()
 
     client.close()
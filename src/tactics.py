@@ -0,0 +1,259 @@
+"""
+Tactical solver for king races: forced escapes and forced king captures.
+
+It is a threat-space search. The attacker only plays forcing moves: king moves that
+leave an open line to an escape square, or black moves onto a square next to the king.
+The defender tries every legal reply. A True answer is therefore a proof. A False
+answer only means that no forced line was found within the move limit or the node
+budget.
+
+Results are cached per Zobrist key, so the search can ask the solver at every leaf
+where the king is outside its safe zone without paying for the same proof twice.
+"""
+import argparse
+import time
+from typing import Dict, Tuple
+
+from bitboard_state import BitboardState
+from geometry import (ESCAPE_MASK, NEIGHBOURS, BLACK_CAPTURE_ANVILS, THRONE_BIT, KING_CAPTURE_SIDES, SAFE_KING_MASK,
+                      RAYS)
+from move_generator import generate_moves, king_moves
+from state import Turn
+
+ESCAPE, CAPTURE = 0, 1
+
+
+class _BudgetExceeded(Exception):
+    """
+    Raised when a single query has visited more nodes than its budget.
+    """
+
+
+class TacticalSolver:
+    """
+    Proves forced king escapes (for white) and forced king captures (for black).
+
+    :param node_limit: Maximum number of positions visited by one query
+    :param cache_size: Number of cached answers kept before the cache is cleared
+    """
+
+    def __init__(self, node_limit: int = 4000, cache_size: int = 1 << 18):
+        self.node_limit = node_limit
+        self.cache_size = cache_size
+        self.cache: Dict[Tuple[int, int, int], bool] = {}
+        self.nodes = 0
+        self.queries = 0
+        self.cache_hits = 0
+        self.proofs = 0
+        self.budget_exceeded = 0
+        self._budget = 0
+
+    @staticmethod
+    def king_in_danger_zone(state: BitboardState) -> bool:
+        """
+        Tells whether the king is outside its safe zone, where tactics are worth looking for.
+        """
+        return bool(state.king) and not state.king & SAFE_KING_MASK
+
+    def king_escape(self, state: BitboardState, white_moves: int) -> bool:
+        """
+        Tells whether white can force the king onto an escape square.
+
+        :param state: The position, with either side to move (left unchanged)
+        :param white_moves: Maximum number of white moves of the escape
+        :return: True if a forced escape was proven
+        """
+        return self._query(state, ESCAPE, white_moves)
+
+    def king_capture(self, state: BitboardState, black_moves: int) -> bool:
+        """
+        Tells whether black can force the capture of the king.
+
+        :param state: The position, with either side to move (left unchanged)
+        :param black_moves: Maximum number of black moves of the capture
+        :return: True if a forced capture was proven
+        """
+        return self._query(state, CAPTURE, black_moves)
+
+    def _query(self, state: BitboardState, kind: int, moves: int) -> bool:
+        self.queries += 1
+        key = (state.zobrist, kind, moves)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached
+        self._budget = self.node_limit
+        depth = len(state.undo_log)
+        try:
+            if kind == ESCAPE:
+                proven = self._escape(state, moves)
+            else:
+                proven = self._capture(state, moves)
+        except _BudgetExceeded:
+            self.budget_exceeded += 1
+            while len(state.undo_log) > depth:
+                state.undo_move()
+            return False
+        if len(self.cache) >= self.cache_size:
+            self.cache.clear()
+        self.cache[key] = proven
+        if proven:
+            self.proofs += 1
+        return proven
+
+    def _visit(self):
+        self.nodes += 1
+        self._budget -= 1
+        if self._budget < 0:
+            raise _BudgetExceeded()
+
+    def _escape(self, state: BitboardState, white_moves: int) -> bool:
+        self._visit()
+        turn = state.turn
+        if turn == Turn.WHITEWIN:
+            return True
+        if turn != Turn.WHITE and turn != Turn.BLACK:
+            return False
+
+        candidates = king_moves(state)
+        threats = [move for move in candidates if ESCAPE_MASK >> move[1] & 1]
+        if turn == Turn.WHITE:
+            if threats:
+                return True
+            if white_moves <= 1:
+                return False
+            for move in candidates:
+                state.apply_move(move)
+                proven = self._escape(state, white_moves - 1)
+                state.undo_move()
+                if proven:
+                    return True
+            return False
+
+        # Black to move: without an open line there is nothing to defend against.
+        if not threats:
+            return False
+        # Blocking the lines to the escapes are the only defences worth trying first.
+        king_sq = threats[0][0]
+        lines = 0
+        for _, escape in threats:
+            step = 1 if abs(escape - king_sq) < 9 else 9
+            for sq in range(min(king_sq, escape), max(king_sq, escape) + 1, step):
+                lines |= 1 << sq
+        moves = generate_moves(state)
+        moves.sort(key=lambda move: not lines >> move[1] & 1)
+        for move in moves:
+            state.apply_move(move)
+            proven = self._escape(state, white_moves)
+            state.undo_move()
+            if not proven:
+                return False
+        return True
+
+    def _capture(self, state: BitboardState, black_moves: int) -> bool:
+        self._visit()
+        turn = state.turn
+        if turn == Turn.BLACKWIN:
+            return True
+        if turn != Turn.WHITE and turn != Turn.BLACK:
+            return False
+        if not state.king:
+            return False
+
+        if turn == Turn.BLACK:
+            if black_moves <= 0:
+                return False
+            king_sq = state.king.bit_length() - 1
+            targets = {adjacent for adjacent, _ in NEIGHBOURS[king_sq] if adjacent >= 0}
+            for move in generate_moves(state):
+                if move[1] not in targets:
+                    continue
+                state.apply_move(move)
+                proven = self._capture(state, black_moves - 1)
+                state.undo_move()
+                if proven:
+                    return True
+            return False
+
+        if black_moves <= 0 or not _capture_threatened(state):
+            return False
+        # King moves first: running away is the likeliest refutation.
+        moves = king_moves(state)
+        king_from = moves[0][0] if moves else -1
+        moves += [move for move in generate_moves(state) if move[0] != king_from]
+        if not moves:
+            return True
+        for move in moves:
+            state.apply_move(move)
+            proven = self._capture(state, black_moves)
+            state.undo_move()
+            if not proven:
+                return False
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "queries": self.queries,
+            "cache_hits": self.cache_hits,
+            "proofs": self.proofs,
+            "nodes": self.nodes,
+            "budget_exceeded": self.budget_exceeded,
+        }
+
+
+def _reachable_by_black(state: BitboardState, sq: int) -> bool:
+    """
+    Tells whether a black pawn might reach the empty square sq in one move. Camps and the
+    throne are ignored, so this can say True for a square that is in fact out of reach.
+    """
+    black = state.black
+    occupied = state.white | black | state.king
+    for ray in RAYS[sq]:
+        for target in ray:
+            if occupied >> target & 1:
+                if black >> target & 1:
+                    return True
+                break
+    return False
+
+
+def _capture_threatened(state: BitboardState) -> bool:
+    """
+    Tells whether black could capture the king if it were black's turn: all the sides the
+    capture needs are hostile but one, which is empty and in reach of a black pawn.
+    """
+    king_sq = state.king.bit_length() - 1
+    hostile = state.black | BLACK_CAPTURE_ANVILS
+    occupied = state.white | state.black
+    if KING_CAPTURE_SIDES[king_sq] > 2:
+        hostile |= THRONE_BIT
+        missing = [adjacent for adjacent, _ in NEIGHBOURS[king_sq] if not hostile >> adjacent & 1]
+        return (len(missing) == 1 and not occupied >> missing[0] & 1
+                and _reachable_by_black(state, missing[0]))
+    sides = NEIGHBOURS[king_sq]
+    for first, second in ((0, 1), (2, 3)):
+        for anvil, target in ((sides[first][0], sides[second][0]), (sides[second][0], sides[first][0])):
+            if (anvil >= 0 and target >= 0 and hostile >> anvil & 1
+                    and not (occupied | THRONE_BIT) >> target & 1 and _reachable_by_black(state, target)):
+                return True
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Look for forced king escapes and captures in a position.")
+    parser.add_argument("position", help="board and turn in the format of State.to_linear_string")
+    parser.add_argument("--moves", type=int, default=2, help="moves of the attacker")
+    parser.add_argument("--nodes", type=int, default=100000, help="node budget of each query")
+    args = parser.parse_args()
+
+    state = BitboardState.from_linear_string(args.position)
+    solver = TacticalSolver(node_limit=args.nodes)
+    start = time.perf_counter()
+    escape = solver.king_escape(state, args.moves)
+    capture = solver.king_capture(state, args.moves)
+    elapsed = time.perf_counter() - start
+    print(f"forced escape: {escape}, forced capture: {capture} ({elapsed * 1000:.1f} ms, {solver.stats()})")
+
+
+if __name__ == "__main__":
+    main()
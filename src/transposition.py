@@ -0,0 +1,142 @@
+"""
+A fixed-size transposition table keyed by the 64-bit Zobrist key of a position.
+
+Entries live in three flat `array` columns instead of per-entry Python objects:
+the full key, the score, and a packed word holding depth, bound type, best move
+and search generation. Each bucket has two slots: the first keeps the deepest
+entry (unless it is from an older search), the second is always replaced.
+"""
+from array import array
+from typing import Optional, Tuple
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+ENTRIES_PER_BUCKET = 2
+# key (8 bytes) + score (8 bytes) + packed data (8 bytes)
+BYTES_PER_ENTRY = 24
+
+_NUM_SQUARES = 81
+_DEPTH_MASK = 0xFF
+_BOUND_SHIFT = 8
+_MOVE_SHIFT = 10
+_MOVE_MASK = 0x1FFF
+_GENERATION_SHIFT = 23
+_GENERATION_MASK = 0xFF
+
+
+class TranspositionTable:
+    """
+    Stores search results (depth, bound type, score and best move) for positions.
+
+    :param size_mb: Memory cap of the table in megabytes; the number of buckets is
+                    the largest power of two that fits
+    """
+
+    def __init__(self, size_mb: int = 64):
+        buckets = 1
+        while (buckets * 2) * ENTRIES_PER_BUCKET * BYTES_PER_ENTRY <= size_mb * 1024 * 1024:
+            buckets *= 2
+        self.size_mb = size_mb
+        self.num_buckets = buckets
+        self.mask = buckets - 1
+        size = buckets * ENTRIES_PER_BUCKET
+        self.keys = array("Q", bytes(8 * size))
+        self.scores = array("d", bytes(8 * size))
+        # 0 marks an empty slot: a stored entry always has a move code of at least 1.
+        self.data = array("Q", bytes(8 * size))
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    def new_search(self):
+        """
+        Marks the beginning of a new search, so that entries from older searches
+        lose their depth priority and can be replaced.
+        """
+        self.generation = (self.generation + 1) & _GENERATION_MASK
+
+    def clear(self):
+        """
+        Empties the table and resets the counters.
+        """
+        size = self.num_buckets * ENTRIES_PER_BUCKET
+        self.keys = array("Q", bytes(8 * size))
+        self.scores = array("d", bytes(8 * size))
+        self.data = array("Q", bytes(8 * size))
+        self.hits = self.misses = self.stores = self.overwrites = 0
+
+    def probe(self, key: int) -> Optional[Tuple[int, int, float, Optional[Tuple[int, int]]]]:
+        """
+        Looks up a position.
+
+        :param key: The 64-bit Zobrist key of the position
+        :return: (depth, bound, score, best_move) if the position is stored, None otherwise
+        """
+        index = (key & self.mask) * ENTRIES_PER_BUCKET
+        keys = self.keys
+        for slot in (index, index + 1):
+            data = self.data[slot]
+            if data and keys[slot] == key:
+                self.hits += 1
+                move_code = (data >> _MOVE_SHIFT) & _MOVE_MASK
+                move = divmod(move_code - 2, _NUM_SQUARES) if move_code > 1 else None
+                return data & _DEPTH_MASK, (data >> _BOUND_SHIFT) & 3, self.scores[slot], move
+        self.misses += 1
+        return None
+
+    def store(self, key: int, depth: int, bound: int, score: float, move: Optional[Tuple[int, int]]):
+        """
+        Stores a search result. The depth-preferred slot is used if it is empty, holds
+        the same position, is from an older search or is not deeper than the new result;
+        otherwise the always-replace slot is overwritten.
+
+        :param key: The 64-bit Zobrist key of the position
+        :param depth: Remaining depth the position was searched to
+        :param bound: EXACT, LOWER (fail high) or UPPER (fail low)
+        :param score: The score found by the search
+        :param move: The best move found, or None
+        """
+        index = (key & self.mask) * ENTRIES_PER_BUCKET
+        preferred = self.data[index]
+        if (not preferred or self.keys[index] == key
+                or (preferred >> _GENERATION_SHIFT) != self.generation
+                or depth >= preferred & _DEPTH_MASK):
+            slot = index
+        else:
+            slot = index + 1
+        old = self.data[slot]
+        if old and self.keys[slot] != key:
+            self.overwrites += 1
+        # A move code of 1 stands for "no move" so that data is never 0 for a used slot.
+        move_code = move[0] * _NUM_SQUARES + move[1] + 2 if move is not None else 1
+        if move is None and old and self.keys[slot] == key:
+            # Keep the best move of an earlier search of the same position.
+            move_code = (old >> _MOVE_SHIFT) & _MOVE_MASK
+        self.keys[slot] = key
+        self.scores[slot] = score
+        self.data[slot] = (min(depth, _DEPTH_MASK) | bound << _BOUND_SHIFT
+                           | move_code << _MOVE_SHIFT | self.generation << _GENERATION_SHIFT)
+        self.stores += 1
+
+    def hit_rate(self) -> float:
+        """
+        Returns the fraction of probes that found their position.
+        """
+        probes = self.hits + self.misses
+        return self.hits / probes if probes else 0.0
+
+    def stats(self) -> dict:
+        """
+        Returns the counters of the table, for tuning its size and replacement policy.
+        """
+        return {
+            "size_mb": self.size_mb,
+            "buckets": self.num_buckets,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate(),
+            "stores": self.stores,
+            "overwrites": self.overwrites,
+        }
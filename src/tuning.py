@@ -0,0 +1,174 @@
+"""
+Texel-style tuning of the heuristic weights on positions labelled with game results.
+
+1. `generate` plays self-play games in the arena and appends every position the engines
+   searched, with the result of its game, to a game record file (see game_records.py):
+
+       python tuning.py generate data.tgr --games 400
+
+2. `fit` extracts the features of all positions at once with heuristics.batch_evaluation
+   and fits the weights of each color by gradient descent, so the logistic function of
+   the evaluation predicts the result of the game:
+
+       python tuning.py fit data.tgr --output heuristics/weights.json
+
+The weights file is read by WhiteHeuristics and BlackHeuristics at startup (see
+heuristics.heuristics.WEIGHTS_FILE).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from typing import Dict, Tuple
+
+import numpy as np
+
+from arena import EngineConfig, play_game
+from game_records import GameRecordReader, GameRecordWriter, boards_from_records
+from heuristics.batch_evaluation import white_features, black_features
+from heuristics.black_heuristics import BlackHeuristics
+from heuristics.white_heuristics import WhiteHeuristics
+
+# Adam hyper-parameters of the fit
+LEARNING_RATE = 0.01
+BETA_1 = 0.9
+BETA_2 = 0.999
+EPSILON = 1e-8
+
+
+def _record_game(arguments: tuple) -> Tuple[int, int, list]:
+    game, seed, depth, opening_plies, max_plies = arguments
+    engine = EngineConfig("selfplay", depth)
+    positions = []
+    _, result, _ = play_game(game, seed, engine, engine, opening_plies, max_plies, positions)
+    # Even games have engine A as white, so "W" is a white win there and a black win in odd games.
+    if result == "D":
+        outcome = 0
+    else:
+        outcome = 1 if (result == "W") == (game % 2 == 0) else -1
+    return game, outcome, positions
+
+
+def generate_dataset(path: str, games: int, seed: int, depth: int, opening_plies: int, max_plies: int,
+                     workers: int) -> int:
+    """
+    Plays self-play games and appends their positions and results to a game record file.
+
+    :return: The number of positions written
+    """
+    jobs = [(game, seed, depth, opening_plies, max_plies) for game in range(games)]
+    count = 0
+    with multiprocessing.Pool(workers) as pool, GameRecordWriter(path) as writer:
+        for game, outcome, positions in pool.imap(_record_game, jobs):
+            writer.write_game(positions, outcome, game)
+            count += len(positions)
+    return count
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(x, -500, 500)))
+
+
+def fit_weights(features: Dict[str, np.ndarray], weights: Dict[str, float], targets: np.ndarray,
+                epochs: int) -> Tuple[Dict[str, float], float, float]:
+    """
+    Fits the weights by minimizing the mean squared error between the game results and
+    sigmoid(K * (evaluation + bias)), the Texel loss. K is set so the default
+    evaluations have unit spread, and only the weights are kept: the bias shifts every
+    score by the same amount, which changes nothing in the search.
+
+    :param features: Feature name -> (N,) array, as returned by white_features / black_features
+    :param weights: The starting weights; their keys fix the features used
+    :param targets: (N,) expected scores of the player the weights are for
+    :param epochs: Number of full-batch gradient steps
+    :return: (fitted weights, loss before, loss after)
+    """
+    keys = list(weights)
+    x = np.column_stack([features[key] for key in keys]).astype(np.float64)
+    w = np.array([weights[key] for key in keys], dtype=np.float64)
+    evaluation = x @ w
+    bias = -float(np.mean(evaluation))
+    scale = 1.0 / max(float(np.std(evaluation)), 1e-9)
+    # Optimize in the scaled space, where the parameters are all of order 1.
+    params = np.append(w * scale, bias * scale)
+    x = np.column_stack([x, np.ones(len(x))])
+    first_moment = np.zeros_like(params)
+    second_moment = np.zeros_like(params)
+
+    def loss_and_gradient(p):
+        predicted = _sigmoid(x @ p)
+        error = predicted - targets
+        gradient = x.T @ (error * predicted * (1 - predicted)) * (2 / len(targets))
+        return float(np.mean(error ** 2)), gradient
+
+    initial_loss, _ = loss_and_gradient(params)
+    for step in range(1, epochs + 1):
+        _, gradient = loss_and_gradient(params)
+        first_moment = BETA_1 * first_moment + (1 - BETA_1) * gradient
+        second_moment = BETA_2 * second_moment + (1 - BETA_2) * gradient ** 2
+        corrected_first = first_moment / (1 - BETA_1 ** step)
+        corrected_second = second_moment / (1 - BETA_2 ** step)
+        params -= LEARNING_RATE * corrected_first / (np.sqrt(corrected_second) + EPSILON)
+    final_loss, _ = loss_and_gradient(params)
+    fitted = {key: round(float(value / scale), 4) for key, value in zip(keys, params[:-1])}
+    return fitted, initial_loss, final_loss
+
+
+def tune(path: str, epochs: int) -> Dict[str, dict]:
+    """
+    Fits the white and black weights on a game record file, e.g. from `generate_dataset`.
+
+    :return: The weights file contents, {"white": {...}, "black": {...}}
+    """
+    reader = GameRecordReader(path)
+    boards = boards_from_records(reader.records)
+    white_score = (reader.records["outcome"].astype(np.float64) + 1) / 2
+    reader.close()
+    tuned = {}
+    for color, features, defaults, targets in (
+            ("white", white_features, WhiteHeuristics(None).weights, white_score),
+            ("black", black_features, BlackHeuristics(None).weights, 1.0 - white_score)):
+        start = time.perf_counter()
+        weights, before, after = fit_weights(features(boards), defaults, targets, epochs)
+        elapsed = time.perf_counter() - start
+        print(f"{color}: {len(boards)} positions, loss {before:.5f} -> {after:.5f}, "
+              f"{elapsed:.2f}s ({elapsed / epochs * 1000:.2f} ms/epoch)")
+        tuned[color] = weights
+    return tuned
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the heuristic weights on self-play games.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    generate = subparsers.add_parser("generate", help="play self-play games and store the labelled positions")
+    generate.add_argument("path")
+    generate.add_argument("--games", type=int, default=200)
+    generate.add_argument("--seed", type=int, default=0)
+    generate.add_argument("--depth", type=int, default=1)
+    generate.add_argument("--opening-plies", type=int, default=8)
+    generate.add_argument("--max-plies", type=int, default=200)
+    generate.add_argument("--workers", type=int, default=os.cpu_count())
+    fit = subparsers.add_parser("fit", help="fit the weights on a stored dataset")
+    fit.add_argument("path")
+    fit.add_argument("--epochs", type=int, default=2000)
+    fit.add_argument("--output", default=None, help="weights file to write (default: print only)")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        start = time.monotonic()
+        count = generate_dataset(args.path, args.games, args.seed, args.depth, args.opening_plies,
+                                 args.max_plies, args.workers)
+        print(f"{count} positions from {args.games} games written to {args.path} "
+              f"in {time.monotonic() - start:.1f}s")
+        return
+
+    tuned = tune(args.path, args.epochs)
+    print(json.dumps(tuned, indent=2))
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(tuned, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
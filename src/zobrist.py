@@ -0,0 +1,78 @@
+"""
+Zobrist keys for Tablut positions.
+
+Every (piece type, square) pair, the empty-throne marker and every turn value get a
+64-bit random key; the key of a position is the XOR of the keys of its contents.
+The keys come from a fixed-seed splitmix64 generator instead of `random` or `hash`,
+so they are the same in every process and can be stored in persistent caches.
+"""
+from typing import List
+
+from geometry import BOARD_SIZE, NUM_SQUARES
+
+MASK_64 = (1 << 64) - 1
+SEED = 0x7AB1075EED
+
+
+def _splitmix64(seed: int):
+    """
+    Yields an endless, reproducible stream of 64-bit pseudo-random numbers.
+    """
+    state = seed & MASK_64
+    while True:
+        state = (state + 0x9E3779B97F4A7C15) & MASK_64
+        z = state
+        z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+        z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK_64
+        yield z ^ (z >> 31)
+
+
+_stream = _splitmix64(SEED)
+WHITE_KEYS = [next(_stream) for _ in range(NUM_SQUARES)]
+BLACK_KEYS = [next(_stream) for _ in range(NUM_SQUARES)]
+KING_KEYS = [next(_stream) for _ in range(NUM_SQUARES)]
+THRONE_KEYS = [next(_stream) for _ in range(NUM_SQUARES)]
+# Keyed by Turn.value so this module does not depend on state.py.
+TURN_KEYS = {value: next(_stream) for value in ("W", "B", "WW", "BW", "D")}
+del _stream
+
+PAWN_KEYS = {"W": WHITE_KEYS, "B": BLACK_KEYS, "K": KING_KEYS, "T": THRONE_KEYS}
+
+
+def hash_board(board: List[list], turn) -> int:
+    """
+    Computes the Zobrist key of a board from scratch.
+
+    :param board: 2D list of Pawn objects
+    :param turn: The Turn of the position, or None
+    :return: The 64-bit key of the position
+    """
+    key = TURN_KEYS[turn.value] if turn is not None else 0
+    if board is None:
+        return key
+    for row, pawns in enumerate(board):
+        for column, pawn in enumerate(pawns):
+            keys = PAWN_KEYS.get(pawn.value)
+            if keys is not None:
+                key ^= keys[row * BOARD_SIZE + column]
+    return key
+
+
+def hash_bitboards(white: int, black: int, king: int, throne: int, turn) -> int:
+    """
+    Computes the Zobrist key of a position given as bitboards from scratch.
+
+    :param white: Bitboard of the white pawns
+    :param black: Bitboard of the black pawns
+    :param king: Bitboard of the king
+    :param throne: Bitboard of the empty-throne marker
+    :param turn: The Turn of the position, or None
+    :return: The 64-bit key of the position
+    """
+    key = TURN_KEYS[turn.value] if turn is not None else 0
+    for bitboard, keys in ((white, WHITE_KEYS), (black, BLACK_KEYS), (king, KING_KEYS), (throne, THRONE_KEYS)):
+        while bitboard:
+            low = bitboard & -bitboard
+            key ^= keys[low.bit_length() - 1]
+            bitboard ^= low
+    return key
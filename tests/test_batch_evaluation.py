@@ -0,0 +1,38 @@
+import random
+
+import numpy as np
+
+from bitboard_state import BitboardState
+from heuristics.batch_evaluation import boards_from_states, evaluate_batch
+from heuristics.black_heuristics import BlackHeuristics
+from heuristics.white_heuristics import WhiteHeuristics
+from move_generator import generate_moves
+from state import Turn
+
+
+def _random_positions(seed: int, games: int):
+    rng = random.Random(seed)
+    states = []
+    for _ in range(games):
+        state = BitboardState.initial()
+        while state.turn in (Turn.WHITE, Turn.BLACK):
+            moves = generate_moves(state)
+            if not moves:
+                break
+            states.append(state.clone())
+            state.apply_move(rng.choice(moves))
+    return states
+
+
+def test_batch_scores_match_scalar_heuristics():
+    states = _random_positions(seed=0, games=20)
+    boards = boards_from_states(states)
+    for color, heuristics_class in ((Turn.WHITE, WhiteHeuristics), (Turn.BLACK, BlackHeuristics)):
+        batch = evaluate_batch(boards, color)
+        scalar = np.array([heuristics_class(state).evaluate_state() for state in states])
+        assert np.allclose(batch, scalar), color
+
+
+def test_list_states_pack_like_bitboard_states():
+    states = _random_positions(seed=1, games=3)
+    assert np.array_equal(boards_from_states(states), boards_from_states(state.to_state() for state in states))
@@ -0,0 +1,16 @@
+from benchmark import load_corpus, missing_categories
+from move_generator import generate_moves
+from search import SearchEngine, WIN_THRESHOLD
+from state import Turn
+
+
+def test_corpus_covers_every_category():
+    assert missing_categories(load_corpus()) == []
+
+
+def test_corpus_positions_are_undecided():
+    for name, state in load_corpus():
+        assert state.turn in (Turn.WHITE, Turn.BLACK), name
+        assert generate_moves(state), name
+        result = SearchEngine(state.turn, max_depth=1).search(state.clone(), float("inf"))
+        assert abs(result.score) < WIN_THRESHOLD, name
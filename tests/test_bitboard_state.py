@@ -0,0 +1,20 @@
+from bitboard_state import BitboardState
+from move_generator import generate_moves
+from state import Pawn
+
+
+def test_remove_pawn_moves_the_repetition_count_to_the_new_key():
+    state = BitboardState.initial()
+    start_key = state.zobrist
+    state.apply_move(generate_moves(state)[0])
+    moved_key = state.zobrist
+    assert state.get_pawn(0, 3) == Pawn.BLACK
+    state.remove_pawn(0, 3)
+
+    assert state.zobrist != moved_key
+    assert state.seen == {start_key: 1, state.zobrist: 1}
+
+    state.undo_move()
+    assert state.zobrist == start_key
+    assert state.seen == {start_key: 1}
+    assert state.get_pawn(0, 3) == Pawn.BLACK